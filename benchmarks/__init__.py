@@ -0,0 +1 @@
+"""Host-side benchmarks of the library, run them with ``python -m benchmarks``."""
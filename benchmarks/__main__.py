@@ -0,0 +1,17 @@
+from . import bench_encoder, bench_group, bench_listeners, bench_memory, bench_replay, bench_alloc, bench_native, bench_startup
+
+bench_encoder.run()
+print()
+bench_group.run()
+print()
+bench_listeners.run()
+print()
+bench_memory.run()
+print()
+bench_replay.run()
+print()
+bench_alloc.run()
+print()
+bench_native.run()
+print()
+bench_startup.run()
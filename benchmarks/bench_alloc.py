@@ -0,0 +1,315 @@
+"""
+Heap allocations of the irq handlers, of the tick and of the dispatch.
+
+A hard interrupt handler must not allocate, and a tick which allocates makes the collector
+run at random moments of a real time loop. Two checks:
+
+- the bytecode of every function run by the handlers, the tick and the dispatch is scanned for the operations
+  which allocate on MicroPython (building containers and strings, closures, keyword calls,
+  exceptions, floats), an except block of the tick counts only for what it builds, the exception is already there
+- the handlers are fed many edges, then the ticks deliver 100k events to listeners, and the heap must not grow:
+  on MicroPython from ``gc.mem_alloc()`` with the collector disabled, so every byte counts, on a host from
+  ``tracemalloc`` restricted to the library files (CPython boxes its own ints, only what stays counts)
+
+The run fails, once the tables are printed, when a function of the irq handlers or of the tick path allocates,
+or the heap grew.
+"""
+
+import gc
+
+from micropython_rotary_encoder import (
+    RotaryEncoderRP2, RotaryEncoderEvent, RotaryEncoderRecorder, RotaryEncoderGroup, RotaryEncoderStats, sim,
+)
+from micropython_rotary_encoder.rotary_encoder import RotaryEncoder, _RotaryEncoderThrottle
+from micropython_rotary_encoder.rotary_encoder_group import _RotaryEncoderGroupMember
+
+from .waveforms import quadrature, with_bounce, press, pause, CLK, DT, SW
+
+try:
+    import dis
+    import tracemalloc
+except ImportError:
+    dis = None
+    tracemalloc = None
+
+# the functions run by the irq handlers
+IRQ_PATH = (
+    ("_enc_irq_handler", RotaryEncoder._enc_irq_handler),
+    ("_enc_irq_edge", RotaryEncoder._enc_irq_edge),
+    ("_enc_clk_irq_handler", RotaryEncoderRP2._enc_clk_irq_handler),
+    ("_enc_dt_irq_handler", RotaryEncoderRP2._enc_dt_irq_handler),
+    ("_enc_process_event", RotaryEncoder._enc_process_event),
+    ("_pos_clamp", RotaryEncoder._pos_clamp),
+    ("_sw_irq_handler", RotaryEncoder._sw_irq_handler),
+    ("_irq_push", RotaryEncoder._irq_push),
+    ("recorder _record", RotaryEncoderRecorder._record),
+    ("recorder _enc_edge", RotaryEncoderRecorder._enc_edge),
+    ("group member set", _RotaryEncoderGroupMember.set),
+)
+
+# the functions run by the ticks and the dispatch of the listeners
+TICK_PATH = (
+    ("_tick", RotaryEncoder._tick),
+    ("_ticks", RotaryEncoder._ticks),
+    ("_tick_arm", RotaryEncoder._tick_arm),
+    ("_tick_timeout", RotaryEncoder._tick_timeout),
+    ("_sw_tick_deadline", RotaryEncoder._sw_tick_deadline),
+    ("_sw_tick_input", RotaryEncoder._sw_tick_input),
+    ("_enc_tick_settle", RotaryEncoder._enc_tick_settle),
+    ("_tick_drain_steps", RotaryEncoder._tick_drain_steps),
+    ("_enc_has_event", RotaryEncoder._enc_has_event),
+    ("_enc_tick_apply_step", RotaryEncoder._enc_tick_apply_step),
+    ("_enc_tick_process_turn_", RotaryEncoder._enc_tick_process_turn_event),
+    ("_tick_flush_event", RotaryEncoder._tick_flush_event),
+    ("_call_listeners", RotaryEncoder._call_listeners),
+    ("_listener_error", RotaryEncoder._listener_error),
+    ("_dispatch_error", RotaryEncoder._dispatch_error),
+    ("_dispatch", RotaryEncoder._dispatch),
+    ("_throttle_arm", RotaryEncoder._throttle_arm),
+    ("_throttle_due", RotaryEncoder._throttle_due),
+    ("_throttle_flush", RotaryEncoder._throttle_flush),
+    ("throttle offer", _RotaryEncoderThrottle.offer),
+    ("throttle deliver", _RotaryEncoderThrottle.deliver),
+    ("velocity", RotaryEncoder.velocity),
+    ("raw_tick", RotaryEncoderRP2.raw_tick),
+    ("_timer_callback", RotaryEncoderRP2._timer_callback),
+    ("_scheduled_dispatch", RotaryEncoderRP2._scheduled_dispatch),
+    ("group _tick", RotaryEncoderGroup._tick),
+    ("group _timer_callback", RotaryEncoderGroup._timer_callback),
+    ("group dispatch", RotaryEncoderGroup.dispatch),
+    ("stats _tick_done", RotaryEncoderStats._tick_done),
+    ("stats _dispatch_done", RotaryEncoderStats._dispatch_done),
+)
+
+_ALLOCATING = (
+    "BUILD_", "FORMAT_VALUE", "MAKE_FUNCTION", "KW_NAMES", "CALL_FUNCTION_EX", "CALL_FUNCTION_KW",
+    "RAISE_VARARGS", "PUSH_EXC_INFO", "SETUP_FINALLY", "LIST_", "DICT_", "SET_",
+)
+
+# BINARY_OP with a true division, its result is a float
+_TRUE_DIVIDE = ("/", "/=")
+
+# entering an except block, it runs only after an exception was raised
+_HANDLER = ("PUSH_EXC_INFO", "SETUP_FINALLY")
+
+
+def allocating_ops(fn, handlers: bool = True) -> list:
+    """allocating_ops returns the names of the operations of fn which allocate on MicroPython, handlers=False skips entering the except blocks"""
+    found = []
+    for ins in dis.get_instructions(fn):
+        if not handlers and ins.opname in _HANDLER:
+            continue
+        if ins.opname.startswith(_ALLOCATING):
+            found.append(ins.opname)
+        elif ins.opname == "BINARY_OP" and ins.argrepr in _TRUE_DIVIDE:
+            found.append("BINARY_OP " + ins.argrepr)
+        elif ins.opname == "LOAD_CONST" and isinstance(ins.argval, float):
+            found.append("LOAD_CONST float")
+    return found
+
+
+def _edges(encoder, pins, rounds: int):
+    """_edges plays turns and bouncy clicks, the records are dropped as a tick would take them"""
+    for _ in range(rounds):
+        for waveform in (quadrature(8, 200), with_bounce(press(5), bounces=3, bounce_us=20)):
+            for delay_us, pin, level in waveform:
+                sim.clock.advance_us(delay_us)
+                pins[pin].drive(level)
+        encoder._irq_tail = encoder._irq_head
+        encoder._recorder._tail = encoder._recorder._head
+
+
+def heap_growth(rounds: int = 500, gpio_snapshot: bool = False) -> tuple:
+    """heap_growth returns (edges, bytes the heap grew by) over rounds of turns and clicks of a hard_irq encoder"""
+    sim.clock.reset(1000000)
+    pins = (
+        sim.SimPin(CLK, sim.SimPin.IN, sim.SimPin.PULL_UP),
+        sim.SimPin(DT, sim.SimPin.IN, sim.SimPin.PULL_UP),
+        sim.SimPin(SW, sim.SimPin.IN, sim.SimPin.PULL_UP),
+    )
+    if tracemalloc is not None:
+        tracemalloc.start()
+
+    encoder = RotaryEncoderRP2(*pins, hard_irq=True, glitch_us=1, timebase_us=True, gpio_snapshot=gpio_snapshot)
+    encoder.set_range(0, 99, wrap=True)
+    encoder.record(RotaryEncoderRecorder(64))
+    encoder.enable_stats()
+    RotaryEncoderGroup(encoder)
+
+    # warm up, the first calls may create caches of the interpreter,
+    # and on a host the counters become boxed ints, each new value then replaces one of the same size
+    _edges(encoder, pins, 100)
+    stats = encoder._stats
+    edges = stats.irq_clk + stats.irq_dt + stats.irq_sw
+
+    if tracemalloc is None:
+        gc.collect()
+        gc.disable()
+        before = gc.mem_alloc()
+        _edges(encoder, pins, rounds)
+        after = gc.mem_alloc()
+        gc.enable()
+    else:
+        library = tracemalloc.Filter(True, "*micropython_rotary_encoder*")
+        simulated = tracemalloc.Filter(False, "*sim.py")
+
+        gc.collect()
+        first = tracemalloc.take_snapshot().filter_traces((library, simulated))
+        _edges(encoder, pins, rounds)
+        gc.collect()
+        second = tracemalloc.take_snapshot().filter_traces((library, simulated))
+        tracemalloc.stop()
+
+        before = 0
+        after = sum(stat.size_diff for stat in second.compare_to(first, "filename"))
+
+    return stats.irq_clk + stats.irq_dt + stats.irq_sw - edges, after - before
+
+
+def _settle(encoder, tick):
+    """_settle moves the time to every pending timeout of the encoder and ticks, until only an edge can change anything"""
+    timeout = encoder._tick_timeout()
+    while timeout >= 0:
+        sim.clock.advance_ms(max(timeout, 1))
+        tick()
+        timeout = encoder._tick_timeout()
+
+
+def _gestures(encoder, pins, tick, counter: list, events: int):
+    """_gestures plays turns both ways and clicks, ticking on every edge, until the listeners got events"""
+    while counter[0] < events:
+        for waveform in (
+                quadrature(8, 200), pause(100), quadrature(-3, 3000), pause(100),
+                with_bounce(press(40), bounces=3, bounce_us=20), pause(80), press(40),
+        ):
+            for delay_us, pin, level in waveform:
+                sim.clock.advance_us(delay_us)
+                if pin is not None:
+                    pins[pin].drive(level)
+                tick()
+            _settle(encoder, tick)
+
+
+def steady_state(dispatch: int = None, events: int = 100000) -> tuple:
+    """
+        steady_state returns (events, bytes the heap grew by) over events delivered to listeners,
+        ticked as raw_tick does (dispatch=None) or as timer_tick does with the dispatch mode given
+    """
+    sim.clock.reset(1000000)
+    pins = (
+        sim.SimPin(CLK, sim.SimPin.IN, sim.SimPin.PULL_UP),
+        sim.SimPin(DT, sim.SimPin.IN, sim.SimPin.PULL_UP),
+        sim.SimPin(SW, sim.SimPin.IN, sim.SimPin.PULL_UP),
+    )
+    if tracemalloc is not None:
+        tracemalloc.start()
+
+    encoder = RotaryEncoderRP2(*pins)
+    encoder.set_range(0, 99, wrap=True)
+    encoder.enable_stats()
+
+    # the listeners live outside the library, their own allocations are not counted on a host
+    counter = [0]
+
+    def count(*args):
+        counter[0] += 1
+
+    for event in (
+            RotaryEncoderEvent.TURN_LEFT, RotaryEncoderEvent.TURN_RIGHT_FAST, RotaryEncoderEvent.TURN,
+            RotaryEncoderEvent.CLICK, RotaryEncoderEvent.MULTIPLE_CLICK, RotaryEncoderEvent.ANY,
+    ):
+        encoder.on(event, count)
+    # and the ones with a delivery policy, their state is allocated by on()
+    encoder.on(RotaryEncoderEvent.TURN, count, max_hz=20)
+    encoder.on(RotaryEncoderEvent.ANY, count, quiet_ms=30)
+    # and the context listeners, the one context is allocated by on() and filled in place
+    encoder.on(RotaryEncoderEvent.ANY, count, context=True)
+    encoder.on(RotaryEncoderEvent.TURN, count, context=True)
+
+    if dispatch is None:
+        tick = encoder.raw_tick
+    else:
+        # the timer is driven by hand, on every edge like the harness does, not every ms
+        encoder.timer_tick(dispatch=dispatch)
+        encoder.timer.deinit()
+
+        def tick():
+            encoder._timer_callback(encoder.timer)
+            if dispatch == RotaryEncoderRP2.DISPATCH_MANUAL:
+                encoder.dispatch()
+            else:
+                sim.run_scheduled()
+
+    # warm up, as for heap_growth
+    _gestures(encoder, pins, tick, counter, 2000)
+    counter[0] = 0
+
+    if tracemalloc is None:
+        gc.collect()
+        gc.disable()
+        before = gc.mem_alloc()
+        _gestures(encoder, pins, tick, counter, events)
+        after = gc.mem_alloc()
+        gc.enable()
+    else:
+        library = tracemalloc.Filter(True, "*micropython_rotary_encoder*")
+        simulated = tracemalloc.Filter(False, "*sim.py")
+
+        gc.collect()
+        first = tracemalloc.take_snapshot().filter_traces((library, simulated))
+        _gestures(encoder, pins, tick, counter, events)
+        gc.collect()
+        second = tracemalloc.take_snapshot().filter_traces((library, simulated))
+        tracemalloc.stop()
+
+        before = 0
+        after = sum(stat.size_diff for stat in second.compare_to(first, "filename"))
+
+    return counter[0], after - before
+
+
+def run():
+    # the checks which failed, the run fails once everything is printed
+    failed = []
+
+    print("Allocations, the functions run by the irq handlers")
+
+    if dis is not None:
+        print("%24s%10s  %s" % ("function", "ops", "allocating"))
+        for name, fn in IRQ_PATH:
+            found = allocating_ops(fn)
+            print("%24s%10d  %s" % (name, len(list(dis.get_instructions(fn))), ", ".join(found) or "-"))
+            if found:
+                failed.append(name)
+
+    for name, gpio_snapshot in (("hard_irq edges", False), ("gpio_snapshot edges", True)):
+        edges, grown = heap_growth(gpio_snapshot=gpio_snapshot)
+        print("%24s%10d  heap grown by %d bytes" % (name, edges, grown))
+        if grown > 0:
+            failed.append(name)
+
+    print("Allocations, the functions run by the ticks and the dispatch")
+
+    if dis is not None:
+        print("%24s%10s  %s" % ("function", "ops", "allocating"))
+        for name, fn in TICK_PATH:
+            found = allocating_ops(fn, handlers=False)
+            print("%24s%10d  %s" % (name, len(list(dis.get_instructions(fn))), ", ".join(found) or "-"))
+            if found:
+                failed.append(name)
+
+    for name, dispatch in (
+            ("raw_tick events", None),
+            ("DISPATCH_MANUAL events", RotaryEncoderRP2.DISPATCH_MANUAL),
+            ("DISPATCH_SCHEDULE events", RotaryEncoderRP2.DISPATCH_SCHEDULE),
+    ):
+        events, grown = steady_state(dispatch)
+        print("%24s%10d  heap grown by %d bytes" % (name, events, grown))
+        if grown > 0:
+            failed.append(name)
+
+    assert not failed, "bench_alloc: allocations in " + ", ".join(failed)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,472 @@
+"""
+Encoder and button benchmark.
+
+Drives the irq handlers and the tick with synthetic quadrature and bounce waveforms
+at several edge rates and reports the per-call cost and the lost-step rate.
+"""
+
+from micropython_rotary_encoder import RotaryEncoderEvent, RotaryEncoderResolution
+
+from .harness import Harness, Meter
+from .waveforms import SW, quadrature, with_bounce, jitter, press, pause
+
+STEPS = 200
+
+# (name, edge_us, bounces)
+TURN_SCENARIOS = (
+    ("slow 1 kHz", 1000, 0),
+    ("medium 5 kHz", 200, 0),
+    ("fast 20 kHz", 50, 0),
+    ("bouncy 1 kHz", 1000, 2),
+    ("bouncy 5 kHz", 200, 2),
+)
+
+TICKS_MS = (1, 10)
+
+
+def _row(*cells):
+    print("".join(str(c).rjust(w) for c, w in zip(cells, (16, 6, 9, 10, 10, 10, 10, 8))))
+
+
+def _ns(meter) -> str:
+    return "%.0f" % meter.avg_ns() if meter.calls else "-"
+
+
+def run_turns(steps: int = STEPS):
+    print("Rotation, %d steps clockwise then %d counterclockwise (costs in ns per call)" % (steps, steps))
+    _row("scenario", "tick", "edges", "enc_irq", "tick", "events", "steps", "lost %")
+
+    for name, edge_us, bounces in TURN_SCENARIOS:
+        for tick_ms in TICKS_MS:
+            h = Harness(tick_ms=tick_ms)
+            h.play(with_bounce(quadrature(steps, edge_us), bounces))
+            h.settle()
+            right = h.steps
+            h.play(with_bounce(quadrature(-steps, edge_us), bounces))
+            h.settle()
+            left = right - h.steps
+
+            enc = h.irq_meters.get("_enc_irq_handler")
+            lost = 100.0 * (2 * steps - min(right, steps) - min(left, steps)) / (2 * steps)
+            _row(
+                name, "%dms" % tick_ms, enc.calls, _ns(enc), _ns(h.tick_meter),
+                sum(h.events.values()), "%d/%d" % (right, -left), "%.1f" % lost,
+            )
+
+
+def run_velocity(steps: int = 20):
+    print("Velocity, %d steps at a constant rate, the fast classification must not depend on the tick" % steps)
+    _row("step every", "tick", "edges", "enc_irq", "tick", "events", "fast", "sps")
+
+    for step_ms in (5, 10, 14, 20, 30, 100):
+        for tick_ms in TICKS_MS:
+            h = Harness(tick_ms=tick_ms)
+            h.play(quadrature(steps, step_ms * 250))
+            h.advance_us(step_ms * 250)
+            h.encoder.raw_tick()
+            velocity = h.encoder.velocity()
+            h.settle()
+
+            enc = h.irq_meters.get("_enc_irq_handler")
+            fast = sum(n for event, n in h.events.items() if event in (7, 9, 11, 13))
+            _row(
+                "%dms" % step_ms, "%dms" % tick_ms, enc.calls, _ns(enc), _ns(h.tick_meter),
+                sum(h.events.values()), fast, velocity,
+            )
+
+
+def run_timebase(steps: int = 40):
+    print("Timebase, %d steps at a constant sub-millisecond rate, the velocity as measured in ms and in us" % steps)
+    _row("step every", "base", "edges", "enc_irq", "tick", "events", "fast", "sps")
+
+    for step_us in (250, 400, 700, 1500):
+        for timebase_us in (False, True):
+            h = Harness(timebase_us=timebase_us, fast_sps=2000)
+            h.play(quadrature(steps, step_us // 4))
+            h.advance_us(step_us // 4)
+            h.encoder.raw_tick()
+            velocity = h.encoder.velocity()
+            h.settle()
+
+            enc = h.irq_meters.get("_enc_irq_handler")
+            fast = sum(n for event, n in h.events.items() if event in (7, 9, 11, 13))
+            _row(
+                "%dus" % step_us, "us" if timebase_us else "ms", enc.calls, _ns(enc), _ns(h.tick_meter),
+                sum(h.events.values()), fast, velocity,
+            )
+
+
+def run_clicks(clicks: int = 50):
+    print("Button, %d separate clicks with bounce (costs in ns per call)" % clicks)
+    _row("scenario", "tick", "edges", "sw_irq", "tick", "events", "clicks", "lost %")
+
+    for tick_ms in TICKS_MS:
+        h = Harness(tick_ms=tick_ms)
+        for _ in range(clicks):
+            h.play(with_bounce(press(100), bounces=3, bounce_us=200))
+            h.play(pause(1000))
+        h.settle()
+
+        sw = h.irq_meters.get("_sw_irq_handler")
+        got = h.events.get(2, 0)
+        _row(
+            "click", "%dms" % tick_ms, sw.calls, _ns(sw), _ns(h.tick_meter),
+            sum(h.events.values()), got, "%.1f" % (100.0 * (clicks - min(got, clicks)) / clicks),
+        )
+
+
+def _presses(*times) -> list:
+    """_presses returns the waveforms of presses and pauses in ms, alternating, starting with a press"""
+    return [pause(ms) if i & 1 else press(ms) for i, ms in enumerate(times)]
+
+
+def _held_turn(*times) -> list:
+    """_held_turn returns the presses, then a press with one step turned while the button is down"""
+    return _presses(*times) + [((0, SW, 0), (100000, SW, 0)), quadrature(1, 2000), ((100000, SW, 0), (100000, SW, 1))]
+
+
+def run_gestures():
+    print("Button gestures, the events of the state machine at a fast and at a slow tick")
+    _row("scenario", "tick", "edges", "tick", "events", "", "", "same")
+
+    E = RotaryEncoderEvent
+    # (name, waveforms builder and the times of its presses and pauses, expected (event, clicks) log)
+    scenarios = (
+        ("click", _presses, (60,), [(E.CLICK, 0)]),
+        ("double click", _presses, (60, 80, 60), [(E.MULTIPLE_CLICK, 2)]),
+        ("triple click", _presses, (60, 80, 60, 80, 60), [(E.MULTIPLE_CLICK, 3)]),
+        ("too long", _presses, (600,), []),
+        ("click + too long", _presses, (60, 80, 600), [(E.CLICK, 0)]),
+        ("double + long", _presses, (60, 80, 60, 80, 600), [(E.MULTIPLE_CLICK, 2)]),
+        ("click + turn", _held_turn, (60, 80), [(E.CLICK, 0), (E.TURN_RIGHT_HOLD, 0), (E.TURN, 1)]),
+        ("hold", _presses, (1500,), [(E.HELD, 0), (E.RELEASED, 0)]),
+        ("click + hold", _presses, (60, 80, 1500), [(E.MULTIPLE_CLICK_HELD, 2), (E.RELEASED, 0)]),
+        ("long hold", _presses, (3500,), [(E.HELD, 0), (E.LONG_HELD, 0), (E.RELEASED, 0)]),
+    )
+    failed = []
+    for name, build, times, expected in scenarios:
+        for tick_ms in (1, 300):
+            h = Harness(tick_ms=tick_ms, long_hold_ms=3000)
+            for waveform in build(*times):
+                h.play(waveform)
+            h.settle()
+
+            edges = sum(m.calls for m in h.irq_meters.values())
+            _row(name, "%dms" % tick_ms, edges, _ns(h.tick_meter), len(h.log), "", "", h.log == expected)
+            if h.log != expected:
+                failed.append("%s at %dms: %r" % (name, tick_ms, h.log))
+
+    assert not failed, "bench_encoder: the gestures differ from the expected events in " + ", ".join(failed)
+
+
+def run_settings():
+    print("Settings changed after construction, the next gestures must follow them")
+    _row("setting", "base", "edges", "tick", "events", "", "", "same")
+
+    E = RotaryEncoderEvent
+    # (name, attribute, value, waveform and its arguments, expected (event, clicks) log without the turns, expected steps)
+    scenarios = (
+        ("sw_hold_ms", "sw_hold_ms", 200, (press, 500), [(E.HELD, 0), (E.RELEASED, 0)], 0),
+        ("sw_click_ms", "sw_click_ms", 100, (press, 200), [], 0),
+        ("sw_long_hold_ms", "sw_long_hold_ms", 800, (press, 1200), [(E.HELD, 0), (E.LONG_HELD, 0), (E.RELEASED, 0)], 0),
+        ("sw_debounce_ms", "sw_debounce_ms", 0, (press, 60), [(E.CLICK, 0)], 0),
+        ("enc_resolution", "enc_resolution", RotaryEncoderResolution.HALF_STEP, (quadrature, 10, 2000), [], 20),
+        ("enc_fast_ms", "enc_fast_ms", 0, (quadrature, 10, 2000), [], 10),
+    )
+    # the turns counted in the log, every one of them with enc_fast_ms=0
+    turns = (E.TURN_LEFT, E.TURN_RIGHT, E.TURN_LEFT_FAST, E.TURN_RIGHT_FAST, E.TURN)
+    failed = []
+    for name, attribute, value, waveform, expected, steps in scenarios:
+        for timebase_us in (False, True):
+            h = Harness(timebase_us=timebase_us, hold_ms=1000, long_hold_ms=3000)
+            setattr(h.encoder, attribute, value)
+            h.play(waveform[0](*waveform[1:]))
+            h.settle()
+
+            log = [record for record in h.log if record[0] not in turns]
+            same = getattr(h.encoder, attribute) == value and log == expected and h.steps == steps
+            if name == "enc_fast_ms":
+                same = same and h.events.get(E.TURN, 0) == steps
+            edges = sum(m.calls for m in h.irq_meters.values())
+            _row(name, "us" if timebase_us else "ms", edges, _ns(h.tick_meter), len(h.log), "", "", same)
+            if not same:
+                failed.append(name)
+
+    assert not failed, "bench_encoder: the settings changed after construction are not followed: " + ", ".join(failed)
+
+
+def run_decoder(steps: int = 20):
+    print("Decoder, %d slow steps clockwise, every count is a separate event" % steps)
+    _row("scenario", "res", "edges", "enc_irq", "invalid", "", "steps", "lost %")
+
+    scenarios = (
+        ("clean", quadrature(steps, 100000), 1),
+        ("clean", quadrature(steps, 100000), 2),
+        ("clean", quadrature(steps, 100000), 4),
+        ("missed 1/7", quadrature(steps, 100000, missed_every=7), 1),
+        ("missed 1/7", quadrature(steps, 100000, missed_every=7), 4),
+        ("jitter", jitter(40, 100000), 1),
+        ("jitter", jitter(40, 100000), 4),
+    )
+    for name, waveform, resolution in scenarios:
+        h = Harness(resolution=resolution)
+        h.play(waveform)
+        h.settle()
+
+        enc = h.irq_meters.get("_enc_irq_handler")
+        expected = steps * resolution if name != "jitter" else 0
+        lost = 100.0 * (expected - min(h.steps, expected)) / expected if expected else 100.0 * h.steps
+        _row(
+            name, "x%d" % resolution, enc.calls, _ns(enc), h.encoder.enc_invalid, "",
+            "%d/%d" % (h.steps, expected), "%.1f" % lost,
+        )
+
+
+def run_slow_tick(rounds: int = 10):
+    print("Slow tick, %d clicks, %d double clicks and %d separate steps per tick period" % (rounds, rounds, rounds))
+    _row("scenario", "tick", "edges", "tick", "overflow", "clicks", "double", "steps")
+
+    for tick_ms in (1, 50, 150, 300):
+        h = Harness(tick_ms=tick_ms)
+        for _ in range(rounds):
+            h.play(press(60))
+            h.play(pause(1000))
+        for _ in range(rounds):
+            h.play(press(60))
+            h.play(pause(80))
+            h.play(press(60))
+            h.play(pause(1000))
+        h.play(quadrature(rounds, 1000, step_pause_us=100000))
+        h.settle()
+
+        edges = sum(m.calls for m in h.irq_meters.values())
+        _row(
+            "mixed", "%dms" % tick_ms, edges, _ns(h.tick_meter), h.encoder.irq_overflow,
+            "%d/%d" % (h.events.get(2, 0), rounds), "%d/%d" % (h.events.get(3, 0), rounds),
+            "%d/%d" % (h.steps, rounds),
+        )
+
+
+def run_idle(idle_s: int = 10):
+    print("Idle, %ds idle, a click, a double click, 10 steps, %ds idle" % (idle_s, idle_s))
+    _row("scenario", "tick", "edges", "tick", "wakeups", "events", "clicks", "steps")
+
+    for tick_ms in (1, 10, 0):
+        h = Harness(tick_ms=tick_ms)
+        h.play(pause(idle_s * 1000))
+        h.play(press(60))
+        h.play(pause(1000))
+        h.play(press(60))
+        h.play(pause(80))
+        h.play(press(60))
+        h.play(pause(1000))
+        h.play(quadrature(10, 2000))
+        h.play(pause(idle_s * 1000))
+
+        edges = sum(m.calls for m in h.irq_meters.values())
+        _row(
+            "polling" if tick_ms else "event driven", "%dms" % tick_ms if tick_ms else "-", edges,
+            _ns(h.tick_meter), h.wakeups, sum(h.events.values()),
+            "%d+%d" % (h.events.get(2, 0), h.events.get(3, 0)), h.steps,
+        )
+
+
+def run_glitch(steps: int = STEPS):
+    print("Glitch filter, %d steps at 2 and 20 kHz, 3 bounces per edge (costs in ns per call)" % steps)
+    _row("scenario", "us", "edges", "enc_irq", "rejected", "invalid", "steps", "lost %")
+
+    scenarios = (
+        ("clean 2k", quadrature(steps, 500)),
+        ("bounce 5us 2k", with_bounce(quadrature(steps, 500), bounces=3, bounce_us=5)),
+        ("bounce 20us 2k", with_bounce(quadrature(steps, 500), bounces=3, bounce_us=20)),
+        ("bounce 5us 20k", with_bounce(quadrature(steps, 50), bounces=3, bounce_us=5)),
+    )
+    for name, waveform in scenarios:
+        waveform = list(waveform)
+        for glitch_us in (0, 10, 50):
+            h = Harness(glitch_us=glitch_us)
+            h.play(waveform)
+            h.settle()
+
+            enc = h.irq_meters.get("_enc_irq_handler")
+            _row(
+                name, glitch_us if glitch_us else "off", enc.calls, _ns(enc), h.encoder.enc_glitches,
+                h.encoder.enc_invalid, "%d/%d" % (h.steps, steps), "%.1f" % (100.0 * abs(steps - h.steps) / steps),
+            )
+
+
+def run_snapshot(steps: int = STEPS):
+    print("GPIO snapshot, %d steps both ways, two Pin.value() reads against one GPIO_IN read (host: GPIO_IN is simulated)" % steps)
+    _row("scenario", "read", "edges", "enc_irq", "tick", "events", "steps", "same")
+
+    failed = []
+    for name, edge_us, bounces in TURN_SCENARIOS:
+        expected = None
+        for gpio_snapshot in (False, True):
+            h = Harness(gpio_snapshot=gpio_snapshot)
+            h.play(with_bounce(quadrature(steps, edge_us), bounces))
+            h.settle()
+            h.play(with_bounce(quadrature(-steps, edge_us), bounces))
+            h.settle()
+
+            # the snapshot has a handler per channel
+            meters = [meter for handler, meter in h.irq_meters.items() if handler != "_sw_irq_handler"]
+            calls = sum(meter.calls for meter in meters)
+            avg_ns = sum(meter.avg_ns() * meter.calls for meter in meters) / max(calls, 1)
+            if expected is None:
+                expected = h.log
+            _row(
+                name, "mem32" if gpio_snapshot else "value", calls, "%.0f" % avg_ns, _ns(h.tick_meter),
+                sum(h.events.values()), h.steps, h.log == expected,
+            )
+            # the snapshot must be in use and decode the same steps as Pin.value()
+            if h.encoder.gpio_snapshot != gpio_snapshot or h.log != expected:
+                failed.append("%s with %s" % (name, "mem32" if gpio_snapshot else "value"))
+
+    assert not failed, "bench_encoder: the GPIO snapshot differs from Pin.value() in " + ", ".join(failed)
+
+
+def run_value(steps: int = STEPS):
+    print("Position, %d steps clockwise then %d counterclockwise at 5 kHz, range 0..%d" % (steps, steps // 2, steps // 2))
+    _row("scenario", "tick", "edges", "enc_irq", "tick", "events", "value", "")
+
+    for name, tick_ms, wrap in (("clamp", None, False), ("wrap", None, True), ("clamp", 1, False)):
+        h = Harness(tick_ms=tick_ms)
+        h.encoder.set_range(0, steps // 2, wrap=wrap)
+        h.play(quadrature(steps, 200))
+        h.play(quadrature(-steps // 2, 200))
+        h.settle()
+
+        enc = h.irq_meters.get("_enc_irq_handler")
+        _row(
+            name, "%dms" % tick_ms if tick_ms else "-", enc.calls, _ns(enc), _ns(h.tick_meter),
+            sum(h.events.values()), h.encoder.value(), "",
+        )
+
+
+def run_stats(steps: int = STEPS):
+    print("Stats, %d bouncy steps and 20 clicks, counters off and on (costs in ns per call)" % steps)
+    _row("stats", "tick", "edges", "enc_irq", "sw_irq", "tick", "events", "counted")
+
+    counted = {}
+    for name, enabled, listened in (("off", False, True), ("on", True, True), ("unlistened", True, False)):
+        h = Harness()
+        if enabled:
+            h.encoder.enable_stats()
+        if not listened:
+            h.encoder.off_all(RotaryEncoderEvent.ANY)
+        h.play(with_bounce(quadrature(steps, 500), bounces=2, bounce_us=5))
+        for _ in range(20):
+            h.play(with_bounce(press(80), bounces=3, bounce_us=200))
+            h.play(pause(600))
+        h.settle()
+
+        enc = h.irq_meters.get("_enc_irq_handler")
+        sw = h.irq_meters.get("_sw_irq_handler")
+        stats = h.encoder.stats()
+        if stats:
+            counted[name] = list(stats.events)
+        _row(
+            name, "1ms", enc.calls + sw.calls, _ns(enc), _ns(sw), _ns(h.tick_meter),
+            sum(h.events.values()), sum(stats.events) if stats else "-",
+        )
+
+    # the counters do not depend on the listeners
+    assert counted["on"] == counted["unlistened"], "bench_encoder: the stats count only the listened events"
+
+
+def _slow_listener(*args):
+    """a listener redrawing a display, a few hundred microseconds on the host"""
+    sum(range(20000))
+
+
+def run_timer(rounds: int = 20):
+    print("Timer tick, %d clicks and %d steps, a slow listener (ns per tick, ticks over 100 us)" % (rounds, rounds))
+    _row("dispatch", "tick", "ticks", "irq avg", ">100us", "events", "clicks", "steps")
+
+    for name, dispatch in (("irq", 0), ("schedule", 1), ("manual", 2)):
+        h = Harness(tick_ms=None)
+        h.encoder.on(RotaryEncoderEvent.ANY, _slow_listener)
+        h.encoder.timer_tick(1, dispatch=dispatch)
+        meter = Meter()
+        h.encoder.timer.callback = meter.wrap(h.encoder.timer.callback)
+
+        for _ in range(rounds):
+            h.play(press(60))
+            h.play(pause(500))
+            h.play(quadrature(1, 1000))
+            h.play(pause(100))
+            # the main loop of DISPATCH_MANUAL
+            h.encoder.dispatch()
+        h.settle()
+        h.encoder.dispatch()
+        h.encoder.timer.deinit()
+
+        _row(
+            name, "1ms", meter.calls, _ns(meter), meter.slow_calls, sum(h.events.values()),
+            h.events.get(2, 0), h.steps,
+        )
+
+
+def run_modes():
+    print("Timer tick, then raw_tick, the listeners get the events queued by the timer and the later ones")
+    _row("dispatch", "tick", "queued", "events", "", "", "", "same")
+
+    E = RotaryEncoderEvent
+    failed = []
+    for name, dispatch in (("schedule", 1), ("manual", 2)):
+        h = Harness(tick_ms=None)
+        h.encoder.timer_tick(1, dispatch=dispatch)
+        h.play(press(60))
+        h.play(pause(500))
+        h.encoder.timer.deinit()
+        queued = (h.encoder._evq_head - h.encoder._evq_tail) & h.encoder._evq_mask
+
+        # the main loop ticks the encoder from now on
+        h.encoder.raw_tick()
+        h.play(press(60))
+        h.play(pause(500))
+        h.encoder.raw_tick()
+
+        same = h.log == [(E.CLICK, 0), (E.CLICK, 0)]
+        _row(name, "raw", queued, len(h.log), "", "", "", same)
+        if not same:
+            failed.append(name)
+
+    assert not failed, "bench_encoder: the events are lost after timer_tick with " + ", ".join(failed)
+
+
+def run():
+    run_decoder()
+    print()
+    run_turns()
+    print()
+    run_velocity()
+    print()
+    run_timebase()
+    print()
+    run_value()
+    print()
+    run_glitch()
+    print()
+    run_snapshot()
+    print()
+    run_stats()
+    print()
+    run_clicks()
+    print()
+    run_gestures()
+    print()
+    run_settings()
+    print()
+    run_modes()
+    print()
+    run_slow_tick()
+    print()
+    run_idle()
+    print()
+    run_timer()
+
+
+if __name__ == "__main__":
+    run()
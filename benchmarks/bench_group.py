@@ -0,0 +1,97 @@
+"""
+RotaryEncoderGroup benchmark.
+
+Six encoders ticked every millisecond, by one group tick or by six separate ticks,
+while none, one or all of them are turned.
+"""
+
+from micropython_rotary_encoder import RotaryEncoderRP2, RotaryEncoderGroup, RotaryEncoderEvent, sim
+from micropython_rotary_encoder.sim import SimPin
+
+from .harness import Meter
+from .waveforms import CLK, quadrature
+
+ENCODERS = 6
+STEPS = 50
+
+
+def _scenario(grouped: bool, active: int) -> tuple:
+    sim.clock.reset(1000000)
+
+    encoders = []
+    pins = []
+    steps = [0]
+    for n in range(ENCODERS):
+        clk = SimPin(3 * n, SimPin.IN, SimPin.PULL_UP)
+        dt = SimPin(3 * n + 1, SimPin.IN, SimPin.PULL_UP)
+        encoder = RotaryEncoderRP2(clk, dt, SimPin(3 * n + 2, SimPin.IN, SimPin.PULL_UP))
+        encoder.on(RotaryEncoderEvent.TURN_RIGHT, lambda: steps.__setitem__(0, steps[0] + 1))
+        encoders.append(encoder)
+        pins.append((clk, dt))
+
+    meter = Meter()
+    if grouped:
+        group = RotaryEncoderGroup(*encoders)
+        tick = meter.wrap(group.raw_tick)
+    else:
+        raw_ticks = [encoder.raw_tick for encoder in encoders]
+
+        def ticks():
+            for raw_tick in raw_ticks:
+                raw_tick()
+
+        tick = meter.wrap(ticks)
+
+    # every active encoder does one step every 100 ms, the edges 1 ms apart
+    waveform = list(quadrature(STEPS, 1000, step_pause_us=96000))
+    elapsed_us = 0
+    for delay_us, pin, level in waveform:
+        elapsed_us += delay_us
+        while elapsed_us >= 1000:
+            sim.clock.advance_us(1000)
+            elapsed_us -= 1000
+            tick()
+        for n in range(active):
+            pins[n][0 if pin == CLK else 1].drive(level)
+
+    for _ in range(1000):
+        sim.clock.advance_us(1000)
+        tick()
+
+    return meter, steps[0]
+
+
+def run_timer():
+    """run_timer checks that a second timer_tick replaces the timer of the first one and deinit stops it"""
+    sim.clock.reset(1000000)
+    encoder = RotaryEncoderRP2(*(SimPin(n, SimPin.IN, SimPin.PULL_UP) for n in range(3)))
+    group = RotaryEncoderGroup(encoder)
+
+    group.timer_tick(1)
+    group.timer_tick(1, dispatch=RotaryEncoderRP2.DISPATCH_MANUAL)
+    timers = len(sim.clock._timers)
+    sim.clock.advance_ms(10)
+    group.deinit()
+
+    print("Group timer, timers after two timer_tick calls %d, after deinit %d" % (timers, len(sim.clock._timers)))
+    assert timers == 1 and not sim.clock._timers, "bench_group: timer_tick leaks the timer of the previous call"
+
+
+def run():
+    Meter.calibrate()
+    print("Group, %d encoders ticked every 1 ms (ns per tick of all the encoders)" % ENCODERS)
+    print("%16s%10s%10s%10s" % ("active", "separate", "group", "steps"))
+
+    for active in (0, 1, ENCODERS):
+        separate, separate_steps = _scenario(False, active)
+        grouped, grouped_steps = _scenario(True, active)
+        print("%16s%10.0f%10.0f%10s" % (
+            active, separate.avg_ns(), grouped.avg_ns(), "%d/%d" % (grouped_steps, separate_steps),
+        ))
+
+    print()
+    run_timer()
+
+
+if __name__ == "__main__":
+    run()
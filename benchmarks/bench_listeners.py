@@ -0,0 +1,256 @@
+"""
+Listener dispatch benchmark.
+
+Flushes one event to 1, 5 and 20 listeners through the current dispatch
+and through the previous one (the original dict of listener lists with its two lookups per event,
+per-listener event test, no subscription bitmask).
+Then a fast spin is delivered to listeners with the delivery policies of on(),
+they must get fewer calls and still all the steps.
+Last the context listeners of on(context=True): their cost next to the plain ones,
+and their records must be the ones of the event stream, with all the steps.
+"""
+
+import time
+
+from micropython_rotary_encoder import RotaryEncoder, RotaryEncoderRP2, RotaryEncoderEvent, hal
+
+from .harness import Harness
+from .waveforms import quadrature
+
+ROUNDS = 20000
+REPEATS = 5
+LISTENERS = (1, 5, 20)
+
+
+class _PreviousDispatch(RotaryEncoder):
+    """the dispatch as it was before the subscription bitmask: a dict of listener lists, looked up per event"""
+
+    __slots__ = ("_previous",)
+
+    def __init__(self, *args, **kwargs):
+        self._previous = {}
+        super().__init__(*args, **kwargs)
+
+    def on(self, event: int, callback: callable, max_hz: int = 0, quiet_ms: int = 0, context: bool = False):
+        if event not in self._previous:
+            self._previous[event] = []
+
+        self._previous[event].append(callback)
+        self._listeners_update()
+
+    def _listeners_update(self):
+        self._listeners_mask = -1
+
+    def _call_listeners(self, event: int, clicks: int, timestamp: int, velocity: int):
+        # local cache
+        __e_e = RotaryEncoderEvent.ANY
+        __m_c_e = RotaryEncoderEvent.MULTIPLE_CLICK
+        __list = self._previous
+
+        if event in __list:
+            for __l in __list[event]:
+                try:
+                    if event == __m_c_e:
+                        __l(clicks)
+                    else:
+                        __l()
+                except Exception as e:
+                    print(f"RotaryEncoder callback error. Event: {event}, Listener: {__l}, Error: {e}")
+        if __e_e in __list:
+            for __l in __list[__e_e]:
+                try:
+                    if event == __m_c_e:
+                        __l(event, clicks)
+                    else:
+                        __l(event, 0)
+                except Exception as e:
+                    print(f"RotaryEncoder callback error. Event: {__e_e}, Listener: {__l}, Error: {e}")
+
+
+def _listener(*args):
+    pass
+
+
+def _flush_ns(encoder_class, subscribed: int, listeners: int, flushed: int, context: bool = False) -> float:
+    """_flush_ns returns the cost of flushing the event flushed with listeners on the event subscribed, best of REPEATS"""
+    encoder = encoder_class(hal.Pin(0), hal.Pin(1), hal.Pin(2))
+    for _ in range(listeners):
+        encoder.on(subscribed, _listener, context=context)
+
+    flush = encoder._tick_flush_event
+    perf_counter_ns = time.perf_counter_ns
+    best = None
+    for _ in range(REPEATS):
+        start = perf_counter_ns()
+        for _ in range(ROUNDS):
+            encoder._flag_last_event = flushed
+            flush(0)
+        spent = perf_counter_ns() - start
+        if best is None or spent < best:
+            best = spent
+    return best / ROUNDS
+
+
+# (name, event, policy kwargs of on())
+POLICIES = (
+    ("every event", RotaryEncoderEvent.TURN, {}),
+    ("max_hz=30", RotaryEncoderEvent.TURN, {"max_hz": 30}),
+    ("max_hz=10", RotaryEncoderEvent.TURN, {"max_hz": 10}),
+    ("quiet_ms=200", RotaryEncoderEvent.TURN, {"quiet_ms": 200}),
+    ("max_hz=10 quiet_ms=50", RotaryEncoderEvent.TURN, {"max_hz": 10, "quiet_ms": 50}),
+    ("ANY max_hz=10", RotaryEncoderEvent.ANY, {"max_hz": 10}),
+)
+
+
+def _turns_of_any(log: list):
+    """_turns_of_any returns an ANY listener which logs the delta of the TURN events"""
+    def listener(event: int, arg: int):
+        if event == RotaryEncoderEvent.TURN:
+            log.append(arg)
+
+    return listener
+
+
+# (name, Harness kwargs, timer_tick dispatch or None)
+MODES = (
+    ("raw_tick 1ms", {"tick_ms": 1}, None),
+    ("event driven", {"tick_ms": 0}, None),
+    ("timer schedule", {"tick_ms": None}, RotaryEncoderRP2.DISPATCH_SCHEDULE),
+    ("timer manual", {"tick_ms": None}, RotaryEncoderRP2.DISPATCH_MANUAL),
+)
+
+
+def _spin(h, steps: int, step_us: int, dispatch):
+    """_spin plays the steps one by one, the main loop of DISPATCH_MANUAL dispatches after each of them"""
+    for _ in range(abs(steps)):
+        h.play(quadrature(1 if steps > 0 else -1, step_us // 4))
+        if dispatch == RotaryEncoderRP2.DISPATCH_MANUAL:
+            h.encoder.dispatch()
+
+    for _ in range(10):
+        h.settle(100)
+        if dispatch == RotaryEncoderRP2.DISPATCH_MANUAL:
+            h.encoder.dispatch()
+
+
+def run_policies(steps: int = 200, step_us: int = 2000):
+    print("Delivery policies, %d steps one every %dus, a TURN on every step (fast_ms=0)" % (steps, step_us))
+    print("%-24s%-16s%10s%10s%10s" % ("listener", "tick", "calls", "steps", "same"))
+
+    failed = []
+    for mode, harness_kwargs, dispatch in MODES:
+        h = Harness(fast_ms=0, **harness_kwargs)
+        if dispatch is not None:
+            h.encoder.timer_tick(1, dispatch=dispatch)
+
+        calls = []
+        for name, event, policy in POLICIES:
+            log = []
+            calls.append((name, log))
+            h.encoder.on(event, _turns_of_any(log) if event == RotaryEncoderEvent.ANY else log.append, **policy)
+
+        _spin(h, steps, step_us, dispatch)
+        _spin(h, -steps // 2, step_us, dispatch)
+        if dispatch is not None:
+            h.encoder.timer.deinit()
+
+        for name, log in calls:
+            print("%-24s%-16s%10d%10d%10s" % (name, mode, len(log), sum(log), sum(log) == h.steps))
+            if sum(log) != h.steps:
+                failed.append("%s with %s" % (name, mode))
+
+    assert not failed, "bench_listeners: the policies lose steps in " + ", ".join(failed)
+
+
+def run_context(steps: int = 60, step_us: int = 3000):
+    print("Context listeners, one event flushed %d times, best of %d (ns per event)" % (ROUNDS, REPEATS))
+    print("%-24s%10s%10s%10s" % ("scenario", "listeners", "plain", "context"))
+    scenarios = (
+        ("turn listeners", RotaryEncoderEvent.TURN_RIGHT, RotaryEncoderEvent.TURN_RIGHT),
+        ("any listeners", RotaryEncoderEvent.ANY, RotaryEncoderEvent.TURN_RIGHT),
+        ("click listeners", RotaryEncoderEvent.MULTIPLE_CLICK, RotaryEncoderEvent.MULTIPLE_CLICK),
+    )
+    for name, subscribed, flushed in scenarios:
+        for listeners in LISTENERS:
+            print("%-24s%10d%10.0f%10.0f" % (
+                name, listeners,
+                _flush_ns(RotaryEncoder, subscribed, listeners, flushed),
+                _flush_ns(RotaryEncoder, subscribed, listeners, flushed, context=True),
+            ))
+
+    print()
+    print("Context listeners against the event stream, %d steps one every %dus and back slower (fast_ms=0)" % (
+        steps, step_us,
+    ))
+    print("%-16s%10s%10s%10s%10s%10s" % ("tick", "events", "same", "steps", "velocity", "contexts"))
+    failed = []
+    for mode, harness_kwargs, dispatch in MODES:
+        h = Harness(fast_ms=0, **harness_kwargs)
+        if dispatch is not None:
+            h.encoder.timer_tick(1, dispatch=dispatch)
+        stream = h.encoder.events(size=256)
+
+        records = []
+        velocities = []
+        deltas = []
+        contexts = set()
+
+        def on_any(ctx):
+            contexts.add(id(ctx))
+            if ctx.event != RotaryEncoderEvent.TURN:
+                records.append((ctx.event, ctx.clicks, ctx.delta, ctx.timestamp))
+                velocities.append(ctx.velocity)
+
+        h.encoder.on(RotaryEncoderEvent.ANY, on_any, context=True)
+        h.encoder.on(RotaryEncoderEvent.TURN, lambda ctx: deltas.append(ctx.delta), context=True)
+
+        _spin(h, steps, step_us, dispatch)
+        _spin(h, -steps // 3, step_us * 4, dispatch)
+        if dispatch is not None:
+            h.encoder.timer.deinit()
+
+        queued = []
+        while stream._tail != stream._head:
+            tail = stream._tail
+            queued.append((stream._ids[tail], stream._clicks[tail], stream._deltas[tail], stream._timestamps[tail]))
+            stream._tail = (tail + 1) & stream._mask
+
+        # a turn has the sign of its delta (0 for the first step after a pause), the other events have none
+        signed = all(v * r[2] >= 0 and (r[2] or not v) for v, r in zip(velocities, records))
+        print("%-16s%10d%10s%10s%10s%10d" % (
+            mode, len(records), records == queued, sum(deltas) == h.steps, signed and any(velocities), len(contexts),
+        ))
+        # one context object is reused for every call
+        if records != queued or sum(deltas) != h.steps or not (signed and any(velocities)) or len(contexts) != 1:
+            failed.append(mode)
+
+    assert not failed, "bench_listeners: the context listeners differ from the event stream with " + ", ".join(failed)
+
+
+def run():
+    print("Listeners, one event flushed %d times, best of %d (ns per event)" % (ROUNDS, REPEATS))
+    print("%-24s%10s%10s%10s" % ("scenario", "listeners", "previous", "current"))
+
+    scenarios = (
+        ("turn listeners", RotaryEncoderEvent.TURN_RIGHT, RotaryEncoderEvent.TURN_RIGHT),
+        ("any listeners", RotaryEncoderEvent.ANY, RotaryEncoderEvent.TURN_RIGHT),
+        ("click listeners", RotaryEncoderEvent.MULTIPLE_CLICK, RotaryEncoderEvent.MULTIPLE_CLICK),
+        ("unsubscribed event", RotaryEncoderEvent.CLICK, RotaryEncoderEvent.TURN_RIGHT),
+    )
+    for name, subscribed, flushed in scenarios:
+        for listeners in LISTENERS:
+            print("%-24s%10d%10.0f%10.0f" % (
+                name, listeners,
+                _flush_ns(_PreviousDispatch, subscribed, listeners, flushed),
+                _flush_ns(RotaryEncoder, subscribed, listeners, flushed),
+            ))
+
+    print()
+    run_policies()
+
+    print()
+    run_context()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,77 @@
+"""
+Memory footprint of an encoder instance.
+
+On MicroPython the heap usage is taken from ``gc.mem_alloc()``, on a host from ``tracemalloc``.
+The host numbers are CPython object sizes, use them to compare revisions, not to size a board.
+"""
+
+import gc
+
+from micropython_rotary_encoder import RotaryEncoder, RotaryEncoderRP2, RotaryEncoderEvent, hal
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+ENCODERS = 8
+
+
+def _allocated() -> int:
+    gc.collect()
+    if tracemalloc is not None:
+        return tracemalloc.get_traced_memory()[0]
+    return gc.mem_alloc()
+
+
+def _pins(n: int) -> tuple:
+    return (
+        hal.Pin(3 * n, hal.Pin.IN, hal.Pin.PULL_UP),
+        hal.Pin(3 * n + 1, hal.Pin.IN, hal.Pin.PULL_UP),
+        hal.Pin(3 * n + 2, hal.Pin.IN, hal.Pin.PULL_UP),
+    )
+
+
+def footprint(encoder_class, count: int = ENCODERS, **kwargs) -> int:
+    """footprint returns the heap used by one encoder, averaged over count instances"""
+    pins = [_pins(n) for n in range(count)]
+    encoders = []
+
+    before = _allocated()
+    for n in range(count):
+        encoders.append(encoder_class(*pins[n], **kwargs))
+    after = _allocated()
+
+    return (after - before) // count
+
+
+def cross_talk(count: int = ENCODERS) -> int:
+    """cross_talk returns the number of callbacks delivered to other encoders than the subscribed one"""
+    encoders = [RotaryEncoder(*_pins(n)) for n in range(count)]
+    calls = []
+    encoders[0].on(RotaryEncoderEvent.ANY, lambda event, clicks: calls.append(event))
+
+    for encoder in encoders[1:]:
+        encoder.on(RotaryEncoderEvent.CLICK, lambda: None)
+        encoder._flag_last_event = RotaryEncoderEvent.CLICK
+        encoder._tick_flush_event(0)
+
+    return len(calls)
+
+
+def run():
+    if tracemalloc is not None:
+        tracemalloc.start()
+
+    print("Memory, %d encoders (bytes per instance)" % ENCODERS)
+    print("%24s%10s" % ("RotaryEncoder", footprint(RotaryEncoder)))
+    print("%24s%10s" % ("RotaryEncoderRP2", footprint(RotaryEncoderRP2)))
+    print("%24s%10s" % ("buffer_size=128", footprint(RotaryEncoderRP2, buffer_size=128)))
+    print("%24s%10s" % ("cross-talk callbacks", cross_talk()))
+
+    if tracemalloc is not None:
+        tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,138 @@
+"""
+Parity of the native variants of the hot paths (micropython_rotary_encoder/rotary_encoder_native.py).
+
+A host has no native emitter, so the module is loaded with ``micropython.native`` and ``micropython.viper``
+as plain decorators: the check covers the logic of the variants, not the machine code.
+The decoder is compared with the transition table on every input, then captures of turns, spins with
+missed edges, holds and clicks are replayed into an encoder running the bytecode methods and into one
+running the native variants, with several resolutions and steps. The events must be the same,
+the run fails on the first divergence once the tables are printed.
+"""
+
+import sys
+
+from micropython_rotary_encoder import RotaryEncoderRP2, RotaryEncoderResolution
+from micropython_rotary_encoder.rotary_encoder import _ENC_TRANSITIONS, _ENC_INVALID, _ENC_RESOLUTIONS
+
+from .bench_replay import capture, replay_log, scenario
+from .waveforms import SW, quadrature, with_bounce, press, pause
+
+# (name, encoder kwargs)
+CONFIGS = (
+    ("full step", {}),
+    ("half step", {"resolution": RotaryEncoderResolution.HALF_STEP}),
+    ("quarter step", {"resolution": RotaryEncoderResolution.QUARTER_STEP}),
+    ("encoder_step=3", {"encoder_step": 3}),
+    ("no fast turns", {"fast_ms": 0}),
+    ("us timebase", {"timebase_us": True}),
+    ("gpio snapshot", {"gpio_snapshot": True}),
+)
+
+
+class _Decorators:
+    """micropython as seen by the native module on a host, the decorators leave the functions as they are"""
+
+    @staticmethod
+    def native(fn):
+        return fn
+
+    viper = native
+
+    @staticmethod
+    def const(value):
+        return value
+
+
+def load_native():
+    """load_native imports rotary_encoder_native with the decorators of _Decorators"""
+    sys.modules["micropython"] = _Decorators
+    try:
+        from micropython_rotary_encoder import rotary_encoder_native
+    finally:
+        del sys.modules["micropython"]
+    return rotary_encoder_native
+
+
+def native_class(native):
+    """native_class returns a RotaryEncoderRP2 running the native variants"""
+    return type("RotaryEncoderNative", (RotaryEncoderRP2,), {
+        "__slots__": (),
+        "_enc_irq_edge": native._enc_irq_edge,
+        "_enc_tick_process_turn_event": native._enc_tick_process_turn_event,
+    })
+
+
+def decoder_mismatches(native) -> int:
+    """decoder_mismatches runs _enc_decode on every transition, count and resolution against the table"""
+    mismatches = 0
+    for stops, threshold in _ENC_RESOLUTIONS.values():
+        for transition in range(16):
+            last_status, new_status = transition >> 2, transition & 3
+            for quarters in range(-3, 4):
+                quarter = _ENC_TRANSITIONS[transition]
+                if quarter == _ENC_INVALID:
+                    expected = 3
+                elif not (stops >> new_status) & 1:
+                    expected = (quarters + quarter) << 2
+                elif quarters + quarter >= threshold:
+                    expected = 1
+                elif quarters + quarter <= -threshold:
+                    expected = 2
+                else:
+                    expected = 0
+
+                if native._enc_decode(last_status, new_status, quarters, stops, threshold) != expected:
+                    mismatches += 1
+    return mismatches
+
+
+def hold_scenario(h):
+    """hold_scenario plays turns with the button held, slow and fast, and a double click"""
+    h.play(((0, SW, 0),))
+    h.play(pause(300))
+    h.play(with_bounce(quadrature(12, 2000), bounces=2, bounce_us=20))
+    h.play(pause(300))
+    h.play(quadrature(-40, 150, missed_every=7))
+    h.play(pause(300))
+    h.play(((0, SW, 1),))
+    h.play(pause(600))
+    h.play(press(60))
+    h.play(pause(80))
+    h.play(press(60))
+    h.play(pause(600))
+
+
+def run():
+    native = load_native()
+    encoder_class = native_class(native)
+
+    print("Native variants, the bytecode and the native hot paths on the same captures (host: logic only)")
+    # the rows which differ, the run fails once everything is printed
+    failed = []
+
+    print("%24s%10s%10s%10s%10s" % ("decoder", "inputs", "", "", "same"))
+    same = decoder_mismatches(native) == 0
+    print("%24s%10d%10s%10s%10s" % ("_enc_decode", 3 * 16 * 7, "", "", same))
+    if not same:
+        failed.append("_enc_decode")
+
+    for capture_name, play in (("turns and clicks", scenario), ("held turns", hold_scenario)):
+        data, _ = capture(play)
+        print("%24s%10s%10s%10s%10s" % (capture_name, "records", "events", "invalid", "same"))
+        for name, kwargs in CONFIGS:
+            count, _, expected, bytecode = replay_log(data, **kwargs)
+            _, _, log, encoder = replay_log(data, encoder_class=encoder_class, **kwargs)
+            same = (
+                log == expected
+                and encoder.value() == bytecode.value()
+                and encoder.enc_invalid == bytecode.enc_invalid
+            )
+            print("%24s%10d%10d%10d%10s" % (name, count, len(log), encoder.enc_invalid, same))
+            if not same:
+                failed.append(capture_name + " " + name)
+
+    assert not failed, "bench_native: the native variants differ in " + ", ".join(failed)
+
+
+if __name__ == "__main__":
+    run()
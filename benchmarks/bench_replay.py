@@ -0,0 +1,96 @@
+"""
+Capture and replay benchmark.
+
+Records the pin transitions of a bouncy turn, a fast spin with missed edges and some clicks,
+replays the capture into a new encoder at several speeds and compares the events.
+At the original speed the events must be the same. A faster replay squeezes the pauses,
+so the turns and the clicks merge, but no step may be lost; it is a throughput test of the irq handlers and the tick.
+"""
+
+import io
+import time
+
+from micropython_rotary_encoder import RotaryEncoderRP2, RotaryEncoderEvent, RotaryEncoderRecorder, sim
+from micropython_rotary_encoder.rotary_encoder_recorder import replay
+from micropython_rotary_encoder.sim import SimPin
+
+from .harness import Harness
+from .waveforms import CLK, DT, SW, quadrature, with_bounce, press, pause
+
+SPEEDS = (1, 2, 10)
+
+
+def scenario(h):
+    """scenario plays a bouncy turn, a fast spin with missed edges and some clicks"""
+    h.play(with_bounce(quadrature(30, 1000), bounces=2, bounce_us=20))
+    h.play(pause(500))
+    h.play(quadrature(-60, 100, missed_every=9))
+    h.play(pause(500))
+    for _ in range(3):
+        h.play(with_bounce(press(80), bounces=3, bounce_us=200))
+        h.play(pause(600))
+
+
+def capture(play=scenario) -> tuple:
+    """capture returns the bytes of a capture of what play(harness) does and the events seen while recording"""
+    h = Harness(tick_ms=None)
+    h.encoder.timer_tick(1, dispatch=RotaryEncoderRP2.DISPATCH_IRQ)
+    recorder = RotaryEncoderRecorder(4096)
+    h.encoder.record(recorder)
+
+    play(h)
+    h.settle()
+    h.encoder.timer.deinit()
+
+    stream = io.BytesIO()
+    recorder.flush(stream)
+    return stream.getvalue(), h.log
+
+
+def replay_log(data: bytes, speed: float = 1, encoder_class=RotaryEncoderRP2, **kwargs) -> tuple:
+    """replay_log replays a capture into a new encoder, returns the (records, host ns spent, events, encoder)"""
+    sim.clock.reset(1000000)
+    pins = (
+        SimPin(CLK, SimPin.IN, SimPin.PULL_UP),
+        SimPin(DT, SimPin.IN, SimPin.PULL_UP),
+        SimPin(SW, SimPin.IN, SimPin.PULL_UP),
+    )
+    encoder = encoder_class(*pins, **kwargs)
+    log = []
+    encoder.on(RotaryEncoderEvent.ANY, lambda event, arg: log.append((event, arg)))
+    encoder.timer_tick(1, dispatch=RotaryEncoderRP2.DISPATCH_IRQ)
+
+    start = time.perf_counter_ns()
+    count = replay(data, pins, speed)
+    sim.clock.advance_ms(2000)
+    spent = time.perf_counter_ns() - start
+    encoder.timer.deinit()
+
+    return count, spent, log, encoder
+
+
+def _steps(log) -> int:
+    return sum(arg for event, arg in log if event == RotaryEncoderEvent.TURN)
+
+
+def run():
+    data, original = capture()
+    print("Replay, a capture of %d records (%d bytes), %d events" % (len(data) // 4, len(data), len(original)))
+    print("%8s%10s%12s%10s%10s%10s" % ("speed", "records", "records/s", "events", "steps", "same"))
+
+    failed = []
+    for speed in SPEEDS:
+        count, spent, log, _ = replay_log(data, speed)
+        print("%8s%10d%12.0f%10d%10s%10s" % (
+            "x%d" % speed, count, count * 1e9 / spent, len(log),
+            "%d/%d" % (_steps(log), _steps(original)), log == original,
+        ))
+        # a faster replay may merge the events, but not lose a step
+        if count != len(data) // 4 or _steps(log) != _steps(original) or (speed == 1 and log != original):
+            failed.append("x%d" % speed)
+
+    assert not failed, "bench_replay: the replay differs from the capture at " + ", ".join(failed)
+
+
+if __name__ == "__main__":
+    run()
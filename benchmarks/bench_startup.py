@@ -0,0 +1,125 @@
+"""
+Startup cost of every entry point of the library.
+
+Every entry point runs in a fresh interpreter (a new process on a host, the library modules
+dropped from ``sys.modules`` on MicroPython): the imports and the first use it needs, measured as
+the time and the heap it takes (``gc.mem_alloc()`` on MicroPython, ``tracemalloc`` on a host).
+The last columns tell whether Timer and asyncio were loaded, a program which only calls raw_tick must not load them.
+"""
+
+import gc
+import sys
+
+try:
+    import subprocess
+except ImportError:
+    subprocess = None
+
+PACKAGE = "micropython_rotary_encoder"
+
+_ENCODER = (
+    "from micropython_rotary_encoder import RotaryEncoderRP2, hal\n"
+    "e = RotaryEncoderRP2(hal.Pin(15, hal.Pin.IN, hal.Pin.PULL_UP), hal.Pin(9, hal.Pin.IN, hal.Pin.PULL_UP), "
+    "hal.Pin(8, hal.Pin.IN, hal.Pin.PULL_UP))\n"
+)
+
+# (name, measured code), everything from an empty interpreter
+ENTRY_POINTS = (
+    ("RotaryEncoder", "from micropython_rotary_encoder import RotaryEncoder"),
+    ("RotaryEncoderRP2", "from micropython_rotary_encoder import RotaryEncoderRP2"),
+    ("RotaryEncoderGroup", "from micropython_rotary_encoder import RotaryEncoderGroup"),
+    ("raw_tick", _ENCODER + "e.raw_tick()"),
+    ("timer_tick", _ENCODER + "e.timer_tick(1)\ne.timer.deinit()"),
+    ("events()", _ENCODER + "e.events()"),
+)
+
+# the part of the measure run in the fresh interpreter, it prints: ns bytes modules timer asyncio
+_PROBE = """
+import gc, sys, time, tracemalloc
+gc.collect()
+tracemalloc.start()
+before = tracemalloc.get_traced_memory()[0]
+start = time.perf_counter_ns()
+{code}
+spent = time.perf_counter_ns() - start
+grown = tracemalloc.get_traced_memory()[0] - before
+from micropython_rotary_encoder import hal
+print(spent, grown, sum(1 for m in sys.modules if m.startswith("{package}")),
+      int("Timer" in hal.__dict__), int("asyncio" in hal.__dict__))
+"""
+
+
+def _drop_modules():
+    for name in [name for name in sys.modules if name == PACKAGE or name.startswith(PACKAGE + ".")]:
+        del sys.modules[name]
+
+
+def _measure_here(code: str) -> tuple:
+    """_measure_here measures in this interpreter, the library modules are imported again"""
+    import time
+
+    saved = {name: module for name, module in sys.modules.items() if name.startswith(PACKAGE)}
+    _drop_modules()
+    try:
+        scope = {}
+        gc.collect()
+        before = gc.mem_alloc()
+        start = time.ticks_us()
+        exec(code, scope)
+        spent = time.ticks_diff(time.ticks_us(), start) * 1000
+        grown = gc.mem_alloc() - before
+
+        hal = sys.modules[PACKAGE + ".hal"]
+        modules = sum(1 for name in sys.modules if name.startswith(PACKAGE))
+        return spent, grown, modules, int("Timer" in hal.__dict__), int("asyncio" in hal.__dict__)
+    finally:
+        _drop_modules()
+        sys.modules.update(saved)
+
+
+def _measure_process(code: str, runs: int = 3) -> tuple:
+    """_measure_process measures in new processes, the fastest of runs"""
+    probe = _PROBE.format(code=code, package=PACKAGE)
+    best = None
+    for _ in range(runs):
+        out = subprocess.run((sys.executable, "-c", probe), capture_output=True, text=True, check=True).stdout
+        result = tuple(int(value) for value in out.split())
+        if best is None or result[0] < best[0]:
+            best = result
+    return best
+
+
+def run_lazy():
+    """run_lazy checks that the import of RotaryEncoder loads none of the modules the package imports on first use"""
+    saved = {name: module for name, module in sys.modules.items() if name.startswith(PACKAGE)}
+    _drop_modules()
+    try:
+        package = __import__(PACKAGE, None, None, ("RotaryEncoder",))
+        loaded = sorted(set(module for module in package._LAZY.values() if PACKAGE + "." + module in sys.modules))
+    finally:
+        _drop_modules()
+        sys.modules.update(saved)
+
+    print("Loaded on first use, but already imported with RotaryEncoder: %s" % (", ".join(loaded) or "none"))
+    assert not loaded, "bench_startup: imported with RotaryEncoder: " + ", ".join(loaded)
+
+
+def run():
+    print("Startup, the imports and the first use of every entry point in a fresh interpreter")
+    print("%24s%10s%10s%10s%8s%8s" % ("entry point", "ms", "KB", "modules", "Timer", "asyncio"))
+
+    for name, code in ENTRY_POINTS:
+        if subprocess is not None:
+            spent, grown, modules, timer, asyncio = _measure_process(code)
+        else:
+            spent, grown, modules, timer, asyncio = _measure_here(code)
+        print("%24s%10.2f%10.1f%10d%8s%8s" % (
+            name, spent / 1e6, grown / 1024, modules, "yes" if timer else "-", "yes" if asyncio else "-",
+        ))
+
+    print()
+    run_lazy()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,151 @@
+"""
+Harness driving a RotaryEncoder through the simulated backend.
+
+The pins are ``sim.SimPin`` objects, the time is ``sim.clock``.
+The cost of the irq handlers and of the tick is measured with the host clock,
+all the library timing logic runs on the virtual clock and is fully deterministic.
+"""
+
+import time
+
+from micropython_rotary_encoder import RotaryEncoderRP2, RotaryEncoderEvent, sim
+from micropython_rotary_encoder.sim import SimPin
+
+from .waveforms import CLK, DT, SW, MISSED
+
+
+class Meter:
+    """Per-call cost of a callable, in host nanoseconds"""
+
+    overhead_ns = 0.0
+
+    def __init__(self, slow_ns: int = 100000):
+        self.calls = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.slow_ns = slow_ns
+        self.slow_calls = 0
+
+    def wrap(self, fn):
+        perf_counter_ns = time.perf_counter_ns
+
+        def measured(*args):
+            start = perf_counter_ns()
+            result = fn(*args)
+            spent = perf_counter_ns() - start
+            self.calls += 1
+            self.total_ns += spent
+            if spent > self.max_ns:
+                self.max_ns = spent
+            if spent > self.slow_ns:
+                self.slow_calls += 1
+            return result
+
+        return measured
+
+    @classmethod
+    def calibrate(cls):
+        """calibrate measures the cost of the measuring wrapper itself, it is subtracted from every average"""
+        if cls.overhead_ns:
+            return
+
+        meter = cls()
+        noop = meter.wrap(lambda *args: None)
+        for _ in range(20000):
+            noop(None)
+        cls.overhead_ns = meter.total_ns / meter.calls
+
+    def avg_ns(self) -> float:
+        if self.calls == 0:
+            return 0.0
+        return max(self.total_ns / self.calls - self.overhead_ns, 0.0)
+
+
+class Harness:
+    """
+        Harness creates an encoder on simulated pins, plays waveforms on them and
+        calls raw_tick every tick_ms of virtual time.
+        With tick_ms=0 the tick is event driven like async_event_tick: it runs on every irq record
+        and on the timeouts returned by the encoder, the number of ticks is in ``wakeups``.
+        With tick_ms=None the harness does not tick, e.g. for encoder.timer_tick().
+    """
+
+    def __init__(self, tick_ms: int = 1, encoder_class=RotaryEncoderRP2, **encoder_kwargs):
+        Meter.calibrate()
+
+        # a board is never at tick 0 when the user starts turning the knob
+        sim.clock.reset(1000000)
+
+        self.tick_ms = tick_ms
+        self.pins = (
+            SimPin(CLK, SimPin.IN, SimPin.PULL_UP),
+            SimPin(DT, SimPin.IN, SimPin.PULL_UP),
+            SimPin(SW, SimPin.IN, SimPin.PULL_UP),
+        )
+        self.encoder = encoder_class(*self.pins, **encoder_kwargs)
+
+        # one meter per irq handler, keyed by the handler name (e.g. "_enc_irq_handler")
+        self.irq_meters = {}
+        for pin in self.pins:
+            if pin.handler is not None:
+                meter = self.irq_meters.setdefault(pin.handler.__name__, Meter())
+                pin.handler = meter.wrap(pin.handler)
+
+        self.tick_meter = Meter()
+        self._tick = self.tick_meter.wrap(self.encoder.raw_tick)
+        self.wakeups = 0
+
+        self._flagged = False
+        if tick_ms is None:
+            self._next_tick_us = None
+        elif tick_ms:
+            self._next_tick_us = sim.clock.now_us() + tick_ms * 1000
+        else:
+            self._next_tick_us = None
+            self.encoder._irq_flag = self
+
+        self.events = {}
+        self.log = []
+        self.steps = 0
+        self.encoder.on(RotaryEncoderEvent.ANY, self._on_any)
+
+    def _on_any(self, event: int, clicks: int):
+        self.events[event] = self.events.get(event, 0) + 1
+        self.log.append((event, clicks))
+        if event == RotaryEncoderEvent.TURN:
+            self.steps += clicks
+
+    def set(self):
+        """set is called by the irq handlers in the event driven mode, as on asyncio.ThreadSafeFlag"""
+        self._flagged = True
+
+    def _run_tick(self):
+        self.wakeups += 1
+        self._flagged = False
+        self._tick()
+
+        if self.tick_ms:
+            self._next_tick_us += self.tick_ms * 1000
+            return
+
+        timeout = self.encoder._tick_timeout()
+        self._next_tick_us = None if timeout < 0 else sim.clock.now_us() + timeout * 1000
+
+    def advance_us(self, us: int):
+        """advance_us moves the virtual time, ticking the encoder on the way"""
+        target = sim.clock.now_us() + us
+        while self._next_tick_us is not None and self._next_tick_us <= target:
+            sim.clock.advance_us(self._next_tick_us - sim.clock.now_us())
+            self._run_tick()
+        sim.clock.advance_us(target - sim.clock.now_us())
+
+    def play(self, waveform):
+        for delay_us, pin, level in waveform:
+            self.advance_us(delay_us)
+            self.pins[pin & ~MISSED].drive(level, irq=not pin & MISSED)
+            if self._flagged:
+                self._run_tick()
+
+    def settle(self, ms: int = 2000):
+        """settle lets the pending events fire"""
+        self.advance_us(ms * 1000)
@@ -0,0 +1,76 @@
+"""
+Synthetic pin waveforms.
+
+A waveform is an iterable of ``(delay_us, pin, level)`` records:
+``delay_us`` is the time since the previous record, ``pin`` is one of ``CLK``, ``DT``, ``SW``.
+"""
+
+CLK = 0
+DT = 1
+SW = 2
+
+MISSED = 0x80
+"flag of the pin of an edge whose interrupt is lost, e.g. ``(delay_us, CLK | MISSED, 0)``"
+
+# (clk, dt) levels of one clockwise quadrature cycle, starting from the detent (both high)
+_CW_CYCLE = ((0, 1), (0, 0), (1, 0), (1, 1))
+
+
+def quadrature(steps: int, edge_us: int, step_pause_us: int = 0, missed_every: int = 0):
+    """
+        quadrature generates a rotation, one step is a full quadrature cycle (4 edges).
+        :param steps: number of steps, positive - clockwise (TURN_RIGHT), negative - counterclockwise
+        :param edge_us: time between two edges, 1000000 // edge_us is the edge rate in Hz
+        :param step_pause_us: extra time before every step
+        :param missed_every: the interrupt of every n-th edge is lost
+    """
+    cycle = _CW_CYCLE if steps > 0 else tuple(reversed(_CW_CYCLE[:-1])) + (_CW_CYCLE[-1],)
+    clk, dt = 1, 1
+    edges = 0
+
+    for _ in range(abs(steps)):
+        delay_us = edge_us + step_pause_us
+        for n_clk, n_dt in cycle:
+            for pin, old, new in ((CLK, clk, n_clk), (DT, dt, n_dt)):
+                if old == new:
+                    continue
+                edges += 1
+                if missed_every and edges % missed_every == 0:
+                    pin |= MISSED
+                yield delay_us, pin, new
+                delay_us = edge_us
+            clk, dt = n_clk, n_dt
+
+
+def jitter(edges: int, edge_us: int):
+    """jitter generates a contact flicking back and forth at the detent, no step must be counted"""
+    for n in range(edges):
+        yield edge_us, CLK, n % 2
+
+
+def with_bounce(waveform, bounces: int = 2, bounce_us: int = 5):
+    """
+        with_bounce adds contact bounce to every edge of the waveform.
+        Each edge is followed by ``bounces`` pairs of short opposite pulses ``bounce_us`` apart.
+        The bounce time is taken from the delay before the next edge.
+    """
+    borrowed = 0
+    for delay_us, pin, level in waveform:
+        yield max(delay_us - borrowed, 0), pin, level
+        for _ in range(bounces):
+            yield bounce_us, pin, 1 - level
+            yield bounce_us, pin, level
+        borrowed = 2 * bounces * bounce_us
+
+
+def press(hold_ms: int, release_ms: int = 0):
+    """press generates one button press held for hold_ms, then waits release_ms with the button released"""
+    yield 0, SW, 0
+    yield hold_ms * 1000, SW, 1
+    if release_ms:
+        yield release_ms * 1000, SW, 1
+
+
+def pause(ms: int):
+    """pause generates a silent period, the level of the button stays released"""
+    yield ms * 1000, SW, 1
@@ -12,6 +12,7 @@ encoder_pin_sw = Pin(ENCODER_SW_PIN, Pin.IN, Pin.PULL_UP)
 # Create the rotary encoder object
 encoder = RotaryEncoderRP2(
     pin_sw=encoder_pin_sw,
+    long_hold_ms=3000,  # enable the LONG_HELD event
 )
 
 
@@ -32,6 +33,14 @@ def held_listener():
     print(f"Held")
 
 
+def multy_click_held_listener(clicks):
+    print(f"Held after {clicks - 1} clicks")
+
+
+def long_held_listener():
+    print(f"Long Held")
+
+
 def released_listener():
     print(f"Released")
 
@@ -41,6 +50,8 @@ encoder.on(RotaryEncoderEvent.ANY, any_event_listener)
 encoder.on(RotaryEncoderEvent.CLICK, single_click_listener)
 encoder.on(RotaryEncoderEvent.MULTIPLE_CLICK, multy_click_listener)
 encoder.on(RotaryEncoderEvent.HELD, held_listener)
+encoder.on(RotaryEncoderEvent.MULTIPLE_CLICK_HELD, multy_click_held_listener)
+encoder.on(RotaryEncoderEvent.LONG_HELD, long_held_listener)
 encoder.on(RotaryEncoderEvent.RELEASED, released_listener)
 
 
@@ -0,0 +1,41 @@
+from machine import Pin
+from micropython_rotary_encoder import RotaryEncoderRP2, RotaryEncoderEvent
+import uasyncio as asyncio
+
+# constants
+ENCODER_CLK_PIN = 15
+ENCODER_DT_PIN = 9
+ENCODER_SW_PIN = 8
+
+
+# Define the pins for the rotary encoder and the button
+encoder_pin_clk = Pin(ENCODER_CLK_PIN, Pin.IN, Pin.PULL_UP)
+encoder_pin_dt = Pin(ENCODER_DT_PIN, Pin.IN, Pin.PULL_UP)
+encoder_pin_sw = Pin(ENCODER_SW_PIN, Pin.IN, Pin.PULL_UP)
+
+# Create the rotary encoder object
+encoder = RotaryEncoderRP2(
+    pin_clk=encoder_pin_clk,
+    pin_dt=encoder_pin_dt,
+    pin_sw=encoder_pin_sw,
+)
+
+
+# Listeners, they get the same context object every time, filled in place
+def turn_listener(ctx):
+    print(f"Turn {ctx.event} at {ctx.timestamp} ms: {ctx.delta} steps, {ctx.velocity} steps/s")
+
+
+def clicks_listener(ctx):
+    print(f"{ctx.clicks} clicks at {ctx.timestamp} ms")
+
+
+# Subscribe to the events
+encoder.on(RotaryEncoderEvent.TURN, turn_listener, context=True)
+encoder.on(RotaryEncoderEvent.MULTIPLE_CLICK, clicks_listener, context=True)
+
+
+# Start the event loop
+print(f"Connect you rotary encoder to the next GPIO pins: CLK {ENCODER_CLK_PIN}, DT {ENCODER_DT_PIN} and SW {ENCODER_SW_PIN}")
+print("In this example, the listeners get the timestamp, delta, velocity and clicks of the events from one context object.")
+asyncio.run(encoder.async_event_tick())
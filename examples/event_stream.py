@@ -0,0 +1,50 @@
+from machine import Pin
+from micropython_rotary_encoder import RotaryEncoderRP2, RotaryEncoderEvent
+import uasyncio as asyncio
+
+# constants
+ENCODER_CLK_PIN = 15
+ENCODER_DT_PIN = 9
+ENCODER_SW_PIN = 8
+
+
+# Define the pins for the rotary encoder and the button
+encoder_pin_clk = Pin(ENCODER_CLK_PIN, Pin.IN, Pin.PULL_UP)
+encoder_pin_dt = Pin(ENCODER_DT_PIN, Pin.IN, Pin.PULL_UP)
+encoder_pin_sw = Pin(ENCODER_SW_PIN, Pin.IN, Pin.PULL_UP)
+
+# Create the rotary encoder object
+encoder = RotaryEncoderRP2(
+    pin_clk=encoder_pin_clk,
+    pin_dt=encoder_pin_dt,
+    pin_sw=encoder_pin_sw,
+)
+
+
+# Consumer, takes the events at its own pace
+async def consumer():
+    counter = 0
+    async for event_id, clicks, delta, timestamp in encoder.events(size=8):
+        if event_id == RotaryEncoderEvent.MULTIPLE_CLICK:
+            print(f"{timestamp}: {clicks} clicks")
+        elif delta:
+            counter += delta
+            print(f"{timestamp}: turn by {delta}, counter {counter}")
+        else:
+            print(f"{timestamp}: event {event_id}")
+
+        # a slow consumer, the events wait in the queue meanwhile
+        await asyncio.sleep_ms(100)
+
+
+async def main():
+    await asyncio.gather(
+        encoder.async_event_tick(),
+        consumer(),
+    )
+
+
+# Start the event loop
+print(f"Connect you rotary encoder to the next GPIO pins: CLK {ENCODER_CLK_PIN}, DT {ENCODER_DT_PIN} and SW {ENCODER_SW_PIN}")
+print("In this example, the events are taken from an asynchronous event stream instead of callbacks.")
+asyncio.run(main())
@@ -0,0 +1,42 @@
+from machine import Pin
+from micropython_rotary_encoder import RotaryEncoderRP2, RotaryEncoderEvent, RotaryEncoderGroup
+import uasyncio as asyncio
+
+# constants, CLK, DT and SW pins of every encoder
+ENCODER_PINS = (
+    (15, 9, 8),
+    (14, 13, 12),
+    (11, 10, 7),
+)
+
+
+# Create the rotary encoder objects
+encoders = []
+for clk, dt, sw in ENCODER_PINS:
+    encoders.append(RotaryEncoderRP2(
+        pin_clk=Pin(clk, Pin.IN, Pin.PULL_UP),
+        pin_dt=Pin(dt, Pin.IN, Pin.PULL_UP),
+        pin_sw=Pin(sw, Pin.IN, Pin.PULL_UP),
+    ))
+
+
+# Listeners
+def make_listener(number):
+    def any_event_listener(event, clicks):
+        print(f"Encoder #{number} Event ID: {event} Clicks: {clicks}")
+
+    return any_event_listener
+
+
+# subscribe to events
+for n, encoder in enumerate(encoders):
+    encoder.on(RotaryEncoderEvent.ANY, make_listener(n))
+
+# one group serves all the encoders, the idle ones are skipped
+group = RotaryEncoderGroup(*encoders)
+
+
+# Start the event loop
+print(f"Connect your rotary encoders to the next GPIO pins (CLK, DT, SW): {ENCODER_PINS}")
+print("All of them are served by a single task, it sleeps until one of them is touched.")
+asyncio.run(group.async_event_tick())
@@ -24,21 +24,14 @@ some_counter = 0
 
 
 # Listeners
-def turn_left_listener():
+def turn_listener(delta: int):
     global some_counter
-    some_counter -= 1
-    print(f"Turn left")
-
-
-def turn_right_listener():
-    global some_counter
-    some_counter += 1
-    print(f"Turn right")
+    some_counter += delta
+    print(f"Turn by {delta}")
 
 
 # subscribe to events
-encoder.on(RotaryEncoderEvent.TURN_LEFT, turn_left_listener)
-encoder.on(RotaryEncoderEvent.TURN_RIGHT, turn_right_listener)
+encoder.on(RotaryEncoderEvent.TURN, turn_listener)
 
 
 # Start the event loop
@@ -0,0 +1,52 @@
+from machine import Pin
+from micropython_rotary_encoder import RotaryEncoderRP2, RotaryEncoderEvent
+import uasyncio as asyncio
+
+# constants
+ENCODER_CLK_PIN = 15
+ENCODER_DT_PIN = 9
+ENCODER_SW_PIN = 8
+
+
+# Define the pins for the rotary encoder and the button
+encoder_pin_clk = Pin(ENCODER_CLK_PIN, Pin.IN, Pin.PULL_UP)
+encoder_pin_dt = Pin(ENCODER_DT_PIN, Pin.IN, Pin.PULL_UP)
+encoder_pin_sw = Pin(ENCODER_SW_PIN, Pin.IN, Pin.PULL_UP)
+
+# Create the rotary encoder object
+encoder = RotaryEncoderRP2(
+    pin_clk=encoder_pin_clk,
+    pin_dt=encoder_pin_dt,
+    pin_sw=encoder_pin_sw,
+)
+
+position = 0
+
+
+# Listeners
+def counter_listener(delta):
+    # cheap, gets every turn
+    global position
+    position += delta
+
+
+def redraw_listener(delta):
+    # expensive, at most 10 times a second, delta is the sum of the turns since the last call
+    print(f"Redraw: turned by {delta}, position {position}")
+
+
+def save_listener(delta):
+    # once the knob rests for a second
+    print(f"Save position {position}")
+
+
+# Subscribe to the events
+encoder.on(RotaryEncoderEvent.TURN, counter_listener)
+encoder.on(RotaryEncoderEvent.TURN, redraw_listener, max_hz=10)
+encoder.on(RotaryEncoderEvent.TURN, save_listener, quiet_ms=1000)
+
+
+# Start the event loop
+print(f"Connect you rotary encoder to the next GPIO pins: CLK {ENCODER_CLK_PIN}, DT {ENCODER_DT_PIN} and SW {ENCODER_SW_PIN}")
+print("In this example, the slow listeners get fewer calls with the turns coalesced.")
+asyncio.run(encoder.async_event_tick())
@@ -1,3 +1,22 @@
 from .version import __version__
-from .rotary_encoder import RotaryEncoder, RotaryEncoderEvent
-from .rotary_encoder_rp2 import RotaryEncoderRP2
+from .rotary_encoder import RotaryEncoder, RotaryEncoderEvent, RotaryEncoderResolution
+
+# the rest is imported on first use, a program which needs only RotaryEncoder does not load the tick drivers
+_LAZY = {
+    "RotaryEncoderRP2": "rotary_encoder_rp2",
+    "RotaryEncoderGroup": "rotary_encoder_group",
+    "RotaryEncoderEventStream": "rotary_encoder_events",
+    "RotaryEncoderEventContext": "rotary_encoder_events",
+    "RotaryEncoderRecorder": "rotary_encoder_recorder",
+    "RotaryEncoderStats": "rotary_encoder_stats",
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(name)
+
+    module = __import__(__name__ + "." + _LAZY[name], None, None, (name,))
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
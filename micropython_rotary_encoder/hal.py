@@ -0,0 +1,98 @@
+"""
+Hardware abstraction layer of the library.
+
+On the board the names below come from ``machine``, ``utime``, ``micropython`` and ``uasyncio``.
+``Timer`` and ``asyncio`` are imported on first use (``hal.asyncio``), a program which only calls
+raw_tick never pays for uasyncio.
+On a host, where those modules do not exist, the simulated backend from ``sim`` is used,
+so the library can be run and benchmarked off-target.
+Any other backend can be plugged in with ``use()``.
+
+The library always looks the names up through this module (``hal.ticks_ms()``),
+so a backend plugged in later is picked up by already created encoders.
+The optional names (``mem32``, ``alloc_emergency_exception_buf``) are imported one by one,
+a board missing one of them never falls back to the simulated backend. ``mem32`` is then None.
+"""
+
+try:
+    import utime as _time
+    from machine import Pin, disable_irq, enable_irq
+except ImportError:
+    from . import sim as _sim
+
+    _time = _sim.clock
+    Pin = _sim.SimPin
+    disable_irq = _sim.disable_irq
+    enable_irq = _sim.enable_irq
+    mem32 = _sim.mem32
+else:
+    # optional, a board without it is still a board, only RotaryEncoderRP2 gpio_snapshot is off
+    try:
+        from machine import mem32
+    except ImportError:
+        mem32 = None
+
+try:
+    from micropython import schedule
+except ImportError:
+    from . import sim as _sim
+
+    schedule = _sim.schedule
+
+try:
+    from micropython import alloc_emergency_exception_buf
+except ImportError:
+    def alloc_emergency_exception_buf(size: int):
+        """a port without it has no emergency buffer to allocate"""
+
+ticks_ms = _time.ticks_ms
+ticks_us = _time.ticks_us
+ticks_diff = _time.ticks_diff
+ticks_add = _time.ticks_add
+
+
+def __getattr__(name):
+    """__getattr__ imports Timer and asyncio on their first use, then they are plain module attributes"""
+    global Timer, asyncio
+
+    if name == "Timer":
+        try:
+            from machine import Timer as _Timer
+        except ImportError:
+            from .sim import SimTimer as _Timer
+
+        Timer = _Timer
+        return _Timer
+
+    if name == "asyncio":
+        try:
+            import uasyncio as _asyncio
+        except ImportError:
+            from .sim import asyncio as _asyncio
+
+        asyncio = _asyncio
+        return _asyncio
+
+    raise AttributeError(name)
+
+
+def use(time=None, pin=None, timer=None):
+    """
+        use is used to plug in another time and/or pin backend.
+        :param time: object with ticks_ms, ticks_us, ticks_diff and ticks_add, e.g. utime or sim.VirtualClock
+        :param pin: class used as machine.Pin
+        :param timer: class used as machine.Timer
+    """
+    global ticks_ms, ticks_us, ticks_diff, ticks_add, Pin, Timer
+
+    if time is not None:
+        ticks_ms = time.ticks_ms
+        ticks_us = time.ticks_us
+        ticks_diff = time.ticks_diff
+        ticks_add = time.ticks_add
+
+    if pin is not None:
+        Pin = pin
+
+    if timer is not None:
+        Timer = timer
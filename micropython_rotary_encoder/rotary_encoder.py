@@ -1,5 +1,7 @@
-import utime
-from machine import Pin
+from array import array
+
+from . import hal
+from .hal import Pin
 
 
 class RotaryEncoderEvent:
@@ -16,11 +18,323 @@ class RotaryEncoderEvent:
     TURN_RIGHT_FAST = 11
     TURN_RIGHT_HOLD = 12
     TURN_RIGHT_FAST_HOLD = 13
+    TURN = 14
+    MULTIPLE_CLICK_HELD = 15
+    LONG_HELD = 16
+
+
+class RotaryEncoderResolution:
+    FULL_STEP = 1
+    "one step per quadrature cycle (x1), a detent of the EC11"
+    HALF_STEP = 2
+    "two steps per quadrature cycle (x2)"
+    QUARTER_STEP = 4
+    "a step on every edge (x4)"
+
+
+# quadrature state is (dt << 1) | clk, the clockwise sequence is 0b11 -> 0b10 -> 0b00 -> 0b01 -> 0b11
+# the table is indexed by the transition (previous_state << 2) | new_state
+# and holds the quarter step of the transition, both pins changed at once is an invalid transition
+_ENC_INVALID = 2
+_ENC_TRANSITIONS = (
+    0, 1, -1, _ENC_INVALID,
+    -1, 0, _ENC_INVALID, 1,
+    1, _ENC_INVALID, 0, -1,
+    _ENC_INVALID, -1, 1, 0,
+)
+
+# size of the listeners storage, indexed by the event id
+_EVENT_SLOTS = RotaryEncoderEvent.LONG_HELD + 1
+# bit per event id, an ANY listener subscribes to all of them
+_EVENT_ALL = (1 << _EVENT_SLOTS) - 2
+# the classified turns, TURN_LEFT ... TURN_RIGHT_FAST_HOLD
+_EVENT_TURNS = (1 << RotaryEncoderEvent.TURN) - (1 << RotaryEncoderEvent.TURN_LEFT)
+# the events put into an event stream, the classified turns carry the delta already
+_EVENT_STREAM = _EVENT_ALL & ~(1 << RotaryEncoderEvent.TURN)
+# the events carrying the signed steps, the classified turns and TURN
+_EVENT_DELTA = _EVENT_TURNS | (1 << RotaryEncoderEvent.TURN)
+# the events whose listeners get an argument, the clicks or the delta
+_EVENT_ARGS = (
+    (1 << RotaryEncoderEvent.MULTIPLE_CLICK)
+    | (1 << RotaryEncoderEvent.TURN)
+    | (1 << RotaryEncoderEvent.MULTIPLE_CLICK_HELD)
+)
+
+# the id queued for the deferred dispatch when the throttled listeners are due, no event has it
+_EVENT_THROTTLED = 0
+
+# the pins of an encoder as numbered by the irq handlers and by the records of RotaryEncoderRecorder
+PIN_CLK = 0
+PIN_DT = 1
+PIN_SW = 2
+
+# kinds of the records pushed by the irq handlers to the ring buffer
+_IRQ_TURN_RIGHT = 0
+_IRQ_TURN_LEFT = 1
+_IRQ_SW_PRESSED = 2
+_IRQ_SW_RELEASED = 3
+
+# states of the button state machine
+_SW_IDLE = 0
+_SW_PRESSED = 1
+# pressed longer than click_ms, a release is not a click anymore, the hold is not reached yet
+_SW_PRESSED_LONG = 2
+_SW_HELD = 3
+_SW_LONG_HELD = 4
+# released after a click, waiting step_ms for the next click
+_SW_RELEASED = 5
+# the encoder turned while the button was pressed, the press is consumed by the turn
+_SW_SUPPRESSED = 6
+# the encoder turned after HELD, no LONG_HELD any more, the release still fires RELEASED
+_SW_HELD_SUPPRESSED = 7
+# the states in which the button is down
+_SW_DOWN = 0b11011110
+
+# inputs of the button state machine
+_SW_IN_PRESS = 0
+_SW_IN_RELEASE = 1
+_SW_IN_DEADLINE = 2
+_SW_IN_TURN = 3
+
+# actions of the transitions
+_SW_A_NONE = 0
+_SW_A_PRESS = 1
+_SW_A_PRESS_AGAIN = 2
+_SW_A_PRESS_LONG = 3
+_SW_A_RELEASE = 4
+_SW_A_HELD = 5
+_SW_A_LONG_HELD = 6
+_SW_A_RELEASED = 7
+_SW_A_CLICK = 8
+_SW_A_CANCEL = 9
+
+# the transition table is indexed by (state << 2) | input and holds (next_state << 4) | action
+_SW_TRANSITIONS = bytes((
+    # _SW_IDLE
+    (_SW_PRESSED << 4) | _SW_A_PRESS,
+    (_SW_IDLE << 4) | _SW_A_NONE,
+    (_SW_IDLE << 4) | _SW_A_NONE,
+    (_SW_IDLE << 4) | _SW_A_NONE,
+    # _SW_PRESSED
+    (_SW_PRESSED << 4) | _SW_A_NONE,
+    (_SW_RELEASED << 4) | _SW_A_RELEASE,
+    (_SW_PRESSED_LONG << 4) | _SW_A_PRESS_LONG,
+    (_SW_SUPPRESSED << 4) | _SW_A_CANCEL,
+    # _SW_PRESSED_LONG
+    (_SW_PRESSED_LONG << 4) | _SW_A_NONE,
+    (_SW_IDLE << 4) | _SW_A_CANCEL,
+    (_SW_HELD << 4) | _SW_A_HELD,
+    (_SW_SUPPRESSED << 4) | _SW_A_CANCEL,
+    # _SW_HELD
+    (_SW_HELD << 4) | _SW_A_NONE,
+    (_SW_IDLE << 4) | _SW_A_RELEASED,
+    (_SW_LONG_HELD << 4) | _SW_A_LONG_HELD,
+    (_SW_HELD_SUPPRESSED << 4) | _SW_A_CANCEL,
+    # _SW_LONG_HELD
+    (_SW_LONG_HELD << 4) | _SW_A_NONE,
+    (_SW_IDLE << 4) | _SW_A_RELEASED,
+    (_SW_LONG_HELD << 4) | _SW_A_NONE,
+    (_SW_HELD_SUPPRESSED << 4) | _SW_A_NONE,
+    # _SW_RELEASED
+    (_SW_PRESSED << 4) | _SW_A_PRESS_AGAIN,
+    (_SW_RELEASED << 4) | _SW_A_NONE,
+    (_SW_IDLE << 4) | _SW_A_CLICK,
+    (_SW_RELEASED << 4) | _SW_A_NONE,
+    # _SW_SUPPRESSED
+    (_SW_SUPPRESSED << 4) | _SW_A_NONE,
+    (_SW_IDLE << 4) | _SW_A_CANCEL,
+    (_SW_SUPPRESSED << 4) | _SW_A_NONE,
+    (_SW_SUPPRESSED << 4) | _SW_A_NONE,
+    # _SW_HELD_SUPPRESSED
+    (_SW_HELD_SUPPRESSED << 4) | _SW_A_NONE,
+    (_SW_IDLE << 4) | _SW_A_RELEASED,
+    (_SW_HELD_SUPPRESSED << 4) | _SW_A_NONE,
+    (_SW_HELD_SUPPRESSED << 4) | _SW_A_NONE,
+))
+
+# the turn velocity is an exponentially weighted moving average of the interval between steps,
+# kept in fixed point (1/16 of the timebase unit), every new interval has a weight of 1/4
+_ENC_FIXED = 4
+_ENC_EWMA_SHIFT = 2
+# a longer pause between two steps starts the estimate over
+_ENC_IDLE_MS = 1000
+
+# resolution: (bitmask of the states where a step is counted, quarter steps needed for a step)
+_ENC_RESOLUTIONS = {
+    RotaryEncoderResolution.FULL_STEP: (0b1000, 2),
+    RotaryEncoderResolution.HALF_STEP: (0b1001, 1),
+    RotaryEncoderResolution.QUARTER_STEP: (0b1111, 1),
+}
+
+
+def _ring_size(size: int) -> int:
+    """_ring_size rounds the size of a ring up to a power of two, a ring keeps one slot free, so it holds size - 1 entries"""
+    __size = 2
+    while __size < size:
+        __size <<= 1
+    return __size
+
+
+class _RotaryEncoderThrottle:
+    """
+        Subscription of a listener given on() with max_hz or quiet_ms. It holds the one call it owes,
+        the events coming meanwhile replace it, the deltas of TURN are summed until a TURN is delivered.
+    """
+
+    __slots__ = (
+        "callback",
+        "event",
+        "period",
+        "quiet",
+        "called",
+        "last_call",
+        "pending",
+        "pending_event",
+        "pending_arg",
+        "pending_delta",
+        "deadline",
+    )
+
+    def __init__(self, callback: callable, event: int, period: int, quiet: int):
+        self.callback = callback
+        self.event = event
+        # both in the units of the timebase of the encoder
+        self.period = period
+        self.quiet = quiet
+        self.called = False
+        self.last_call = 0
+        self.pending = False
+        self.pending_event = 0
+        self.pending_arg = 0
+        self.pending_delta = 0
+        self.deadline = 0
+
+    def offer(self, event: int, arg: int, now: int) -> bool:
+        """offer takes an event, calls the listener if it is allowed now, returns True while a call is owed"""
+        # no step is lost, even when a newer event of an ANY listener replaced a TURN
+        if event == RotaryEncoderEvent.TURN:
+            self.pending_delta += arg
+            arg = self.pending_delta
+
+        self.pending = True
+        self.pending_event = event
+        self.pending_arg = arg
+
+        # trailing edge: quiet after the last event, and never sooner than a period after the last call.
+        # The time since the last call is compared, not two deadlines, a call older than half the ticks period
+        # gives a negative diff and does not hold the event back
+        __wait = self.quiet
+        if self.called:
+            __elapsed = hal.ticks_diff(now, self.last_call)
+            if 0 <= __elapsed < self.period and self.period - __elapsed > __wait:
+                __wait = self.period - __elapsed
+        self.deadline = hal.ticks_add(now, __wait)
+
+        if __wait == 0:
+            self.deliver(now)
+            return False
+        return True
+
+    def deliver(self, now: int):
+        """deliver calls the listener with the owed event, its arguments are as for on() without a policy"""
+        self.pending = False
+        self.called = True
+        self.last_call = now
+        if self.pending_event == RotaryEncoderEvent.TURN:
+            self.pending_delta = 0
+
+        if self.event == RotaryEncoderEvent.ANY:
+            self.callback(self.pending_event, self.pending_arg)
+        elif (_EVENT_ARGS >> self.event) & 1:
+            self.callback(self.pending_arg)
+        else:
+            self.callback()
 
 
 class RotaryEncoder:
     """Base class for encoder button"""
 
+    __slots__ = (
+        "pin_clk",
+        "pin_dt",
+        "pin_sw",
+        "enc_step",
+        "enc_fast_sps",
+        "enc_fast_exit_sps",
+        "_enc_resolution",
+        "enc_invalid",
+        "timebase_us",
+        "enc_glitch_us",
+        "enc_glitches",
+        "irq_overflow",
+        "_irq_kinds",
+        "_irq_timestamps",
+        "_irq_mask",
+        "_irq_head",
+        "_irq_tail",
+        "_irq_steps",
+        "_irq_steps_ts",
+        "_irq_flag",
+        "_tick_pending",
+        "_tick_armed",
+        "_tick_deadline",
+        "event_overflow",
+        "last_error",
+        "last_error_event",
+        "_evq_ids",
+        "_evq_args",
+        "_evq_timestamps",
+        "_evq_velocities",
+        "_evq_mask",
+        "_evq_head",
+        "_evq_tail",
+        "_enc_last_event_ms",
+        "_enc_last_dir",
+        "_enc_delta",
+        "_enc_last_step",
+        "_enc_interval",
+        "_enc_fast",
+        "_enc_burst_fast",
+        "_enc_burst_hold",
+        "_enc_last_status",
+        "_enc_quarters",
+        "_enc_stops",
+        "_enc_threshold",
+        "_enc_edge_us",
+        "_t_debounce",
+        "_t_hold",
+        "_t_step",
+        "_t_click",
+        "_t_long_hold",
+        "_t_fast",
+        "_t_idle",
+        "_t_second",
+        "_flag_last_event",
+        "_pos_value",
+        "_pos_min",
+        "_pos_max",
+        "_pos_wrap",
+        "_pos_step",
+        "_sw_irq_state",
+        "_sw_irq_ms",
+        "_sw_state",
+        "_sw_press_ms",
+        "_sw_deadline",
+        "_sw_armed",
+        "_sw_clicks",
+        "_listeners",
+        "_listeners_mask",
+        "_throttled",
+        "_thr_armed",
+        "_thr_deadline",
+        "_ctx",
+        "_ctx_listeners",
+        "_ctx_mask",
+        "_events",
+        "_recorder",
+        "_stats",
+    )
+
     pin_clk: Pin
     "attribute EncoderButton.pin_clk is the pin for the encoder clk"
 
@@ -30,47 +344,166 @@ class RotaryEncoder:
     pin_sw: Pin
     "attribute EncoderButton.pin_sw is the pin for the encoder sw"
 
-    sw_debounce_ms: int = 50
-    "attribute EncoderButton.sw_debounce_ms is used to filter out pin jitter"
-
-    enc_step: int = 1
+    enc_step: int
     "attribute EncoderButton.enc_step is used to filter out pin jitter"
 
-    sw_hold_ms: int = 1000
-    "attribute EncoderButton.sw_hold_ms is used to detect a long press"
+    enc_fast_sps: int
+    "attribute EncoderButton.enc_fast_sps is the velocity (steps per second) from which a turn is fast"
+
+    enc_fast_exit_sps: int
+    "attribute EncoderButton.enc_fast_exit_sps is the velocity below which a fast turn becomes normal again"
+
+    enc_invalid: int
+    "attribute EncoderButton.enc_invalid counts the invalid transitions (both pins changed, an edge was missed)"
+
+    timebase_us: bool
+    "attribute EncoderButton.timebase_us is True when the state machines run on ticks_us instead of ticks_ms"
+
+    enc_glitch_us: int
+    "attribute EncoderButton.enc_glitch_us is the shortest time between two encoder edges, closer edges are rejected, 0 disables the filter"
+
+    enc_glitches: int
+    "attribute EncoderButton.enc_glitches counts the encoder edges rejected by the glitch filter"
+
+    irq_overflow: int
+    "attribute EncoderButton.irq_overflow counts the irq records dropped because the ring buffer was full, a dropped step is still counted"
+
+    _irq_kinds: bytearray
+
+    _irq_timestamps: array
+
+    _irq_mask: int
+
+    _irq_head: int
+
+    _irq_tail: int
+
+    _irq_steps: int
+
+    _irq_steps_ts: int
+
+    _irq_flag: object
+
+    _tick_pending: bool
+
+    _tick_armed: bool
+
+    _tick_deadline: int
+
+    event_overflow: int
+    "attribute EncoderButton.event_overflow counts the events dropped because the deferred dispatch queue was full"
+
+    last_error: Exception
+    "attribute EncoderButton.last_error is the last exception raised while the listeners were called, None if none"
+
+    last_error_event: int
+    "attribute EncoderButton.last_error_event is the event whose listeners raised last_error"
+
+    _evq_ids: bytearray
+
+    _evq_args: array
+
+    _evq_timestamps: array
+
+    _evq_velocities: array
+
+    _evq_mask: int
+
+    _evq_head: int
+
+    _evq_tail: int
+
+    _enc_last_event_ms: int
+
+    _enc_last_dir: int
+
+    _enc_delta: int
+
+    _enc_last_step: int
+
+    _enc_interval: int
+
+    _enc_fast: bool
+
+    _enc_burst_fast: bool
 
-    sw_step_ms: int = 200
-    "attribute EncoderButton.sw_step_ms is used to detect a multiple press"
+    _enc_burst_hold: bool
 
-    sw_click_ms: int = 400
-    "attribute EncoderButton.sw_click_ms is used to detect a single click"
+    _enc_last_status: int
 
-    enc_fast_ms: int = 50
-    "attribute EncoderButton.enc_fast_ms is used to detect a fast encoder turn"
+    _enc_quarters: int
 
-    _enc_last_event_ms: int = 0
+    _enc_resolution: int
 
-    _enc_last_dir: int = 0
+    _enc_stops: int
 
-    _enc_last_status: int = 0
+    _enc_threshold: int
 
-    _flag_last_event: int = 0
+    _enc_edge_us: int
 
-    _sw_last_event_ms: int = 0
+    _t_debounce: int
 
-    _sw_prev_event_ms: int = 0
+    _t_hold: int
 
-    _sw_prev_state: bool = False
+    _t_step: int
 
-    _sw_last_state: bool = False
+    _t_click: int
 
-    _sw_held_with_encoder: bool = False
+    _t_long_hold: int
 
-    _sw_held: bool = False
+    _t_fast: int
 
-    _sw_clicks: int = 0
+    _t_idle: int
 
-    _listeners: dict = {}
+    _t_second: int
+
+    _flag_last_event: int
+
+    _pos_value: int
+
+    _pos_min: int
+
+    _pos_max: int
+
+    _pos_wrap: bool
+
+    _pos_step: int
+
+    _sw_irq_state: bool
+
+    _sw_irq_ms: int
+
+    _sw_state: int
+
+    _sw_press_ms: int
+
+    _sw_deadline: int
+
+    _sw_armed: bool
+
+    _sw_clicks: int
+
+    _listeners: list
+
+    _listeners_mask: int
+
+    _throttled: tuple
+
+    _thr_armed: bool
+
+    _thr_deadline: int
+
+    _ctx: "RotaryEncoderEventContext"
+
+    _ctx_listeners: list
+
+    _ctx_mask: int
+
+    _events: "RotaryEncoderEventStream"
+
+    _recorder: "RotaryEncoderRecorder"
+
+    _stats: "RotaryEncoderStats"
 
     def __init__(
             self,
@@ -83,211 +516,993 @@ class RotaryEncoder:
             step_ms: int = 200,
             fast_ms: int = 50,
             click_ms: int = 400,
+            resolution: int = RotaryEncoderResolution.FULL_STEP,
+            buffer_size: int = 32,
+            fast_sps: int = 66,
+            fast_exit_sps: int = None,
+            glitch_us: int = 0,
+            timebase_us: bool = False,
+            long_hold_ms: int = 0,
     ):
         self.pin_clk = pin_clk
         self.pin_dt = pin_dt
         self.pin_sw = pin_sw
-        self.sw_debounce_ms = debounce_ms
         self.enc_step = encoder_step
-        self.sw_hold_ms = hold_ms
-        self.sw_step_ms = step_ms
-        self.enc_fast_ms = fast_ms
-        self.sw_click_ms = click_ms
+        self.enc_fast_sps = fast_sps
+        self.enc_fast_exit_sps = fast_sps * 3 // 4 if fast_exit_sps is None else fast_exit_sps
+        self._enc_resolution = resolution
+        self._enc_stops, self._enc_threshold = _ENC_RESOLUTIONS[resolution]
+        self.enc_invalid = 0
+        self.timebase_us = timebase_us
+
+        # the thresholds in the units of the timebase, converted here and by the setters of the *_ms properties,
+        # the timestamps (the *_ms attributes) are in the same units
+        __unit = 1000 if timebase_us else 1
+        self._t_debounce = debounce_ms * __unit
+        self._t_hold = hold_ms * __unit
+        self._t_step = step_ms * __unit
+        self._t_click = click_ms * __unit
+        self._t_long_hold = long_hold_ms * __unit
+        self._t_fast = fast_ms * __unit
+        self._t_idle = _ENC_IDLE_MS * __unit
+        self._t_second = 1000 * __unit
+
+        self.enc_glitch_us = glitch_us
+        self.enc_glitches = 0
+        self._enc_edge_us = hal.ticks_us()
+        self.irq_overflow = 0
+
+        size = _ring_size(buffer_size)
+        self._irq_kinds = bytearray(size)
+        self._irq_timestamps = array("i", [0] * size)
+        self._irq_mask = size - 1
+        self._irq_head = 0
+        self._irq_tail = 0
+        # the signed steps which did not fit into the full ring and the time of the last of them, drained by the tick
+        self._irq_steps = 0
+        self._irq_steps_ts = 0
+        # asyncio.ThreadSafeFlag set on every irq record, while an event driven tick waits for it
+        self._irq_flag = None
+        # set by the irq handlers on every record and by the tick while a deadline is armed,
+        # a tick which finds it cleared has nothing to do
+        self._tick_pending = False
+        # the nearest deadline of the state machines (the end of a turn, the button timeouts)
+        self._tick_armed = False
+        self._tick_deadline = 0
+
+        # deferred dispatch queue of (event id, clicks or delta), allocated by _defer_dispatch
+        self.event_overflow = 0
+        self._evq_ids = None
+        self._evq_args = None
+        self._evq_timestamps = None
+        self._evq_velocities = None
+        self._evq_mask = 0
+        self._evq_head = 0
+        self._evq_tail = 0
+
+        # the errors of the listeners are kept here, reporting them must not allocate in the tick
+        self.last_error = None
+        self.last_error_event = 0
+
+        self._enc_last_event_ms = 0
+        self._enc_last_dir = 0
+        self._enc_delta = 0
+        self._enc_last_step = 0
+        self._enc_interval = self._t_idle << _ENC_FIXED
+        self._enc_fast = False
+        self._enc_burst_fast = False
+        self._enc_burst_hold = False
+        self._enc_last_status = 0b11
+        self._enc_quarters = 0
+        self._flag_last_event = 0
+
+        # position counter, updated by the irq handler, see value() and set_range()
+        self._pos_value = 0
+        self._pos_min = None
+        self._pos_max = None
+        self._pos_wrap = False
+        self._pos_step = 1
 
-    def on(self, event: int, callback: callable):
-        if event not in self._listeners:
-            self._listeners[event] = []
+        self._sw_irq_state = False
+        self._sw_irq_ms = 0
+        # the button state machine, see _SW_TRANSITIONS, it only runs on an edge or on its deadline
+        self._sw_state = _SW_IDLE
+        self._sw_press_ms = 0
+        self._sw_deadline = 0
+        self._sw_armed = False
+        self._sw_clicks = 0
 
-        self._listeners[event].append(callback)
+        # a tuple of callbacks per event id, replaced on every subscription change
+        self._listeners = [()] * _EVENT_SLOTS
+        # bit n is set while the event n has a listener, the tick does not build the events nobody listens to
+        self._listeners_mask = 0
+        # the subscriptions with a delivery policy, see on(), and the nearest call they owe
+        self._throttled = ()
+        self._thr_armed = False
+        self._thr_deadline = 0
+        # the context listeners of on(context=True), the context and their tuples are allocated by the first of them
+        self._ctx = None
+        self._ctx_listeners = None
+        # bit n is set while the event n has a context listener, the velocity is computed only for them
+        self._ctx_mask = 0
+        # the stream returned by events(), fed by the tick
+        self._events = None
+        # the recorder given to record(), the irq handlers pass it the pin transitions
+        self._recorder = None
+        # the counters of enable_stats(), every hook is skipped while it is None
+        self._stats = None
+
+        if pin_clk is not None and pin_dt is not None:
+            self._enc_last_status = (pin_dt.value() << 1) | pin_clk.value()
+
+    @property
+    def sw_debounce_ms(self) -> int:
+        """sw_debounce_ms is used to filter out pin jitter"""
+        return self._t_debounce // (self._t_second // 1000)
+
+    @sw_debounce_ms.setter
+    def sw_debounce_ms(self, value: int):
+        self._t_debounce = value * (self._t_second // 1000)
+
+    @property
+    def sw_hold_ms(self) -> int:
+        """sw_hold_ms is used to detect a long press, a new value applies from the next press"""
+        return self._t_hold // (self._t_second // 1000)
+
+    @sw_hold_ms.setter
+    def sw_hold_ms(self, value: int):
+        self._t_hold = value * (self._t_second // 1000)
+
+    @property
+    def sw_step_ms(self) -> int:
+        """sw_step_ms is used to detect a multiple press"""
+        return self._t_step // (self._t_second // 1000)
+
+    @sw_step_ms.setter
+    def sw_step_ms(self, value: int):
+        self._t_step = value * (self._t_second // 1000)
+
+    @property
+    def sw_click_ms(self) -> int:
+        """sw_click_ms is used to detect a single click"""
+        return self._t_click // (self._t_second // 1000)
+
+    @sw_click_ms.setter
+    def sw_click_ms(self, value: int):
+        self._t_click = value * (self._t_second // 1000)
+
+    @property
+    def sw_long_hold_ms(self) -> int:
+        """sw_long_hold_ms is used to detect a very long press, 0 disables the LONG_HELD event"""
+        return self._t_long_hold // (self._t_second // 1000)
+
+    @sw_long_hold_ms.setter
+    def sw_long_hold_ms(self, value: int):
+        self._t_long_hold = value * (self._t_second // 1000)
+
+    @property
+    def enc_fast_ms(self) -> int:
+        """enc_fast_ms is the pause after the last step before a turn event fires, 0 disables fast turns"""
+        return self._t_fast // (self._t_second // 1000)
+
+    @enc_fast_ms.setter
+    def enc_fast_ms(self, value: int):
+        self._t_fast = value * (self._t_second // 1000)
+
+    @property
+    def enc_resolution(self) -> int:
+        """enc_resolution is the number of steps per quadrature cycle, see RotaryEncoderResolution"""
+        return self._enc_resolution
+
+    @enc_resolution.setter
+    def enc_resolution(self, value: int):
+        __stops, __threshold = _ENC_RESOLUTIONS[value]
+        # the irq handlers read the decoder state, it changes at once, a step in progress starts over
+        __state = hal.disable_irq()
+        self._enc_resolution = value
+        self._enc_stops = __stops
+        self._enc_threshold = __threshold
+        self._enc_quarters = 0
+        hal.enable_irq(__state)
+
+    def on(self, event: int, callback: callable, max_hz: int = 0, quiet_ms: int = 0, context: bool = False):
+        """
+            on subscribes the callback to the event. Without a policy it is called on every event.
+            :param max_hz: the callback is called at most max_hz times a second, the events in between
+                are coalesced into the next call: the last one is delivered, the deltas of TURN are summed
+            :param quiet_ms: the callback is called only once the event did not fire for quiet_ms (trailing edge)
+            :param context: the callback is called with the RotaryEncoderEventContext of the event as its only argument,
+                the same object for every event, filled in place
+        """
+        if context:
+            if max_hz or quiet_ms:
+                raise ValueError("RotaryEncoder: a context listener takes no delivery policy")
+            if self._ctx is None:
+                # the optional parts are imported on their first use, a program which does not use them does not load them
+                from .rotary_encoder_events import RotaryEncoderEventContext
+
+                self._ctx = RotaryEncoderEventContext()
+                self._ctx_listeners = [()] * _EVENT_SLOTS
+            self._ctx_listeners[event] += (callback,)
+        elif not max_hz and not quiet_ms:
+            self._listeners[event] += (callback,)
+        else:
+            # the state of the policy is allocated here, once per subscription, not per event
+            __unit = self._t_second // 1000
+            __period = self._t_second // max_hz if max_hz else 0
+            self._throttled += (_RotaryEncoderThrottle(callback, event, __period, quiet_ms * __unit),)
+        self._listeners_update()
 
     def off(self, event: int, callback: callable):
-        if event in self._listeners:
-            self._listeners[event].remove(callback)
+        if callback in self._listeners[event]:
+            __list = list(self._listeners[event])
+            __list.remove(callback)
+            self._listeners[event] = tuple(__list)
+        elif self._ctx_listeners is not None and callback in self._ctx_listeners[event]:
+            __list = list(self._ctx_listeners[event])
+            __list.remove(callback)
+            self._ctx_listeners[event] = tuple(__list)
+        else:
+            __list = list(self._throttled)
+            for __t in __list:
+                if __t.event == event and __t.callback == callback:
+                    __list.remove(__t)
+                    break
+            else:
+                raise ValueError("RotaryEncoder: the callback is not subscribed to the event")
+            self._throttled = tuple(__list)
+        self._listeners_update()
 
     def off_all(self, event: int, callback: callable = None):
-        if event in self._listeners:
+        if callback is None:
+            self._listeners[event] = ()
+        else:
+            self._listeners[event] = tuple(__l for __l in self._listeners[event] if __l != callback)
+        if self._ctx_listeners is not None:
             if callback is None:
-                self._listeners[event] = []
+                self._ctx_listeners[event] = ()
             else:
-                while callback in self._listeners[event]:
-                    self._listeners[event].remove(callback)
+                self._ctx_listeners[event] = tuple(__l for __l in self._ctx_listeners[event] if __l != callback)
+        self._throttled = tuple(
+            __t for __t in self._throttled if __t.event != event or (callback is not None and __t.callback != callback)
+        )
+        self._listeners_update()
+
+    def events(self, size: int = 16, overflow: int = None) -> "RotaryEncoderEventStream":
+        """
+            events returns an asynchronous iterator over the encoder events, for a task consuming them at its own pace.
+            It yields (event_id, clicks, delta, timestamp) records, delta is the signed steps of a turn event,
+            timestamp is in the timebase units (ms, or us with timebase_us).
+            The events are queued by the tick, so the encoder must still be ticked.
+            A new call replaces the previous stream, which ends.
+            :param size: the queue size, rounded up to a power of two, it keeps size - 1 events until the consumer takes them
+            :param overflow: RotaryEncoderEventStream.DROP_OLDEST (None) or DROP_NEWEST, what a full queue drops
+        """
+        from .rotary_encoder_events import RotaryEncoderEventStream
+
+        if overflow is None:
+            overflow = RotaryEncoderEventStream.DROP_OLDEST
+        if self._events is not None:
+            self._events.close()
+
+        self._events = RotaryEncoderEventStream(self, size, overflow)
+        self._listeners_update()
+        return self._events
+
+    def record(self, recorder: "RotaryEncoderRecorder" = None):
+        """record starts capturing the pin transitions seen by the irq handlers into the recorder, None stops it"""
+        if recorder is not None:
+            __levels = 0
+            if self.pin_clk is not None and self.pin_dt is not None:
+                __levels |= (self.pin_clk.value() << PIN_CLK) | (self.pin_dt.value() << PIN_DT)
+            if self.pin_sw is not None:
+                __levels |= self.pin_sw.value() << PIN_SW
+            recorder.start(__levels)
+
+        self._recorder = recorder
+
+    def enable_stats(self, enable: bool = True):
+        """enable_stats starts collecting the runtime counters returned by stats(), False stops it"""
+        if not enable:
+            self._stats = None
+        elif self._stats is None:
+            from .rotary_encoder_stats import RotaryEncoderStats
+
+            self._stats = RotaryEncoderStats(_EVENT_SLOTS)
+
+    def stats(self) -> "RotaryEncoderStats":
+        """stats returns the runtime counters, None unless enable_stats() was called, reset them with stats().reset()"""
+        return self._stats
+
+    def _events_close(self, stream: "RotaryEncoderEventStream"):
+        if self._events is stream:
+            self._events = None
+            self._listeners_update()
+
+    def _listeners_update(self):
+        """_listeners_update rebuilds the bitmask of the subscribed events, it runs on every subscription change"""
+        __list = self._listeners
+
+        __mask = 0 if self._events is None else _EVENT_STREAM
+        for __event in range(RotaryEncoderEvent.ANY, _EVENT_SLOTS):
+            if __list[__event]:
+                __mask |= 1 << __event
+        for __t in self._throttled:
+            __mask |= 1 << __t.event
+
+        __ctx_mask = 0
+        if self._ctx_listeners is not None:
+            for __event in range(RotaryEncoderEvent.ANY, _EVENT_SLOTS):
+                if self._ctx_listeners[__event]:
+                    __ctx_mask |= 1 << __event
+            if __ctx_mask & (1 << RotaryEncoderEvent.ANY):
+                __ctx_mask = _EVENT_ALL
+        self._ctx_mask = __ctx_mask
+        __mask |= __ctx_mask
+
+        # an ANY listener subscribes to all of them
+        if __mask & (1 << RotaryEncoderEvent.ANY):
+            __mask = _EVENT_ALL
+        self._listeners_mask = __mask
+
+    def velocity(self) -> int:
+        """velocity returns the turn velocity in steps per second as of the last tick, positive to the right"""
+        __dt = hal.ticks_diff(self._ticks(), self._enc_last_event_ms)
+
+        # compared before the shift, a long pause shifted into fixed point would not be a small int any more
+        if __dt >= self._t_idle:
+            return 0
+
+        __interval = __dt << _ENC_FIXED
+        if __interval < self._enc_interval:
+            __interval = self._enc_interval
+
+        if __interval >= self._t_idle << _ENC_FIXED:
+            return 0
+
+        return self._enc_last_step * (self._t_second << _ENC_FIXED) // max(__interval, 1)
+
+    def _ticks(self) -> int:
+        """_ticks returns the current time in the timebase units"""
+        return hal.ticks_us() if self.timebase_us else hal.ticks_ms()
+
+    def value(self, value: int = None):
+        """
+            value returns the position counter, with an argument it sets it.
+            The counter is updated right in the irq handler, reading it needs no tick.
+        """
+        if value is None:
+            return self._pos_value
+
+        self._pos_value = self._pos_clamp(value, False)
+
+    def set_range(self, min_value: int = None, max_value: int = None, wrap: bool = False, step: int = 1):
+        """
+            set_range configures the position counter.
+            :param min_value: the lowest value, None for no limit
+            :param max_value: the highest value, None for no limit
+            :param wrap: past a limit the counter goes over to the other limit instead of stopping
+            :param step: the value change per encoder step
+        """
+        if wrap and (min_value is None or max_value is None):
+            raise ValueError("RotaryEncoder: wrap needs both min_value and max_value")
+
+        self._pos_min = min_value
+        self._pos_max = max_value
+        self._pos_wrap = wrap
+        self._pos_step = step
+        self._pos_value = self._pos_clamp(self._pos_value, False)
+
+    def _pos_clamp(self, value: int, wrap: bool) -> int:
+        """_pos_clamp brings the value into the range, past a limit it goes over to the other one with wrap"""
+        if self._pos_max is not None and value > self._pos_max:
+            return self._pos_min if wrap else self._pos_max
+        if self._pos_min is not None and value < self._pos_min:
+            return self._pos_max if wrap else self._pos_min
+        return value
+
+    def _irq_push(self, kind: int, timestamp: int):
+        head = self._irq_head
+        next_head = (head + 1) & self._irq_mask
+        if next_head == self._irq_tail:
+            self.irq_overflow += 1
+            # a full ring loses the timestamp of a step, never the step
+            if kind <= _IRQ_TURN_LEFT:
+                self._irq_steps += 1 if kind == _IRQ_TURN_RIGHT else -1
+                self._irq_steps_ts = timestamp
+            return
+
+        self._irq_kinds[head] = kind
+        self._irq_timestamps[head] = timestamp
+        self._irq_head = next_head
+        self._tick_pending = True
+
+        if self._irq_flag is not None:
+            self._irq_flag.set()
 
     def _sw_irq_handler(self, pin):
-        timestamp = utime.ticks_ms()
+        timestamp = hal.ticks_us() if self.timebase_us else hal.ticks_ms()
         c_s = pin.value() == 0
 
-        if self._sw_last_state == c_s or utime.ticks_diff(timestamp, self._sw_last_event_ms) < self.sw_debounce_ms:
-            return
+        if self._recorder is not None:
+            self._recorder._record(PIN_SW, 0 if c_s else 1, False)
 
-        self._sw_prev_state = self._sw_last_state
-        self._sw_last_state = c_s
-        self._sw_last_event_ms = timestamp
+        # a bounce is an edge within the debounce time of the last accepted one, a diff gone negative
+        # after an idle longer than half the ticks period is not one (with timebase_us it is about 9 minutes)
+        bounce = 0 <= hal.ticks_diff(timestamp, self._sw_irq_ms) < self._t_debounce
 
-    def _sw_tick_process_event(self):
-        # local cache
-        __sw_l_s = self._sw_last_state
-        __sw_h_w_e = self._sw_held_with_encoder
-        __sw_s_ms = self.sw_step_ms
-        __sw_l_e_ms = self._sw_last_event_ms
-        __sw_p_e_ms = self._sw_prev_event_ms
-
-        # button event already processed
-        if __sw_l_s == self._sw_prev_state:
-            return
+        if self._stats is not None:
+            self._stats.irq_sw += 1
+            if self._sw_irq_state != c_s and bounce:
+                self._stats.sw_debounced += 1
 
-        # process encoder event with held button
-        if __sw_h_w_e and __sw_l_s:
+        if self._sw_irq_state == c_s or bounce:
             return
 
-        elif __sw_h_w_e and not __sw_l_s:
-            self._sw_held_with_encoder = False
-            self._sw_last_event_ms = 0
-            return
+        self._sw_irq_state = c_s
+        self._sw_irq_ms = timestamp
+        self._irq_push(_IRQ_SW_PRESSED if c_s else _IRQ_SW_RELEASED, timestamp)
+
+    def _sw_tick_deadline(self, timestamp: int):
+        """_sw_tick_deadline runs the expired deadlines of the button, each one at its own time"""
+        while self._sw_armed and hal.ticks_diff(timestamp, self._sw_deadline) >= 0:
+            self._sw_tick_input(_SW_IN_DEADLINE, self._sw_deadline)
+
+    def _sw_tick_input(self, signal: int, timestamp: int):
+        __transition = _SW_TRANSITIONS[(self._sw_state << 2) | signal]
+        self._sw_state = __transition >> 4
+        __action = __transition & 0x0f
 
-        timestamp = utime.ticks_ms()
+        if __action == _SW_A_NONE:
+            return
 
-        # button pressed
-        if __sw_l_s:
-            # button held
-            if utime.ticks_diff(utime.ticks_ms(), __sw_l_e_ms) > self.sw_hold_ms and not self._sw_held:
-                self._sw_held = True
+        if __action == _SW_A_PRESS or __action == _SW_A_PRESS_AGAIN:
+            self._sw_clicks = 1 if __action == _SW_A_PRESS else self._sw_clicks + 1
+            self._sw_press_ms = timestamp
+            self._sw_deadline = hal.ticks_add(timestamp, self._t_click)
+            self._sw_armed = True
+        elif __action == _SW_A_PRESS_LONG:
+            self._sw_deadline = hal.ticks_add(self._sw_press_ms, self._t_hold)
+        elif __action == _SW_A_RELEASE:
+            self._sw_deadline = hal.ticks_add(timestamp, self._t_step)
+        elif __action == _SW_A_HELD:
+            # a hold after a click is a separate gesture, e.g. the double click and hold
+            if self._sw_clicks > 1:
+                self._flag_last_event = RotaryEncoderEvent.MULTIPLE_CLICK_HELD
+            else:
                 self._flag_last_event = RotaryEncoderEvent.HELD
-            # it's a multiple click
-            elif utime.ticks_diff(__sw_l_e_ms, self._sw_prev_event_ms) < __sw_s_ms:
-                self._sw_prev_event_ms = 1
+            self._tick_flush_event(timestamp)
+            self._sw_clicks = 0
+            if self._t_long_hold:
+                self._sw_deadline = hal.ticks_add(self._sw_press_ms, self._t_long_hold)
+            else:
+                self._sw_armed = False
+        elif __action == _SW_A_LONG_HELD:
+            self._flag_last_event = RotaryEncoderEvent.LONG_HELD
+            self._tick_flush_event(timestamp)
+            self._sw_armed = False
+        elif __action == _SW_A_RELEASED:
+            self._flag_last_event = RotaryEncoderEvent.RELEASED
+            self._tick_flush_event(timestamp)
+            self._sw_armed = False
+        elif __action == _SW_A_CLICK:
+            if self._sw_clicks > 1:
+                self._flag_last_event = RotaryEncoderEvent.MULTIPLE_CLICK
+            else:
+                self._flag_last_event = RotaryEncoderEvent.CLICK
+            self._tick_flush_event(timestamp)
+            self._sw_clicks = 0
+            self._sw_armed = False
         else:
-            # button release
-            if self._sw_held:
-                self._sw_held = False
-                self._flag_last_event = RotaryEncoderEvent.RELEASED
-                self._sw_prev_state = __sw_l_s
-            # maybe a multiple click, need wait for the next event
-            elif utime.ticks_diff(timestamp, __sw_l_e_ms) < __sw_s_ms:
-                if __sw_p_e_ms == 1:
-                    if self._sw_clicks == 0:
-                        self._sw_clicks = 1
-                    self._sw_clicks += 1
-                self._sw_prev_event_ms = timestamp
-            # maybe a single click
-            elif utime.ticks_diff(timestamp, __sw_l_e_ms) < self.sw_click_ms:
-                # it's a single click
-                if self._sw_clicks == 0:
-                    self._flag_last_event = RotaryEncoderEvent.CLICK
-                else:
+            # a cancelled press still ends the clicks finished before it
+            if self._sw_clicks > 1:
+                self._sw_clicks -= 1
+                if self._sw_clicks > 1:
                     self._flag_last_event = RotaryEncoderEvent.MULTIPLE_CLICK
-                self._sw_prev_state = __sw_l_s
-            # some old event, skip it
-            else:
-                self._sw_prev_state = __sw_l_s
+                else:
+                    self._flag_last_event = RotaryEncoderEvent.CLICK
+                self._tick_flush_event(timestamp)
+            self._sw_clicks = 0
+            self._sw_armed = False
 
     def _enc_irq_handler(self, pin):
+        # two reads, the second pin may change in between, see RotaryEncoderRP2 gpio_snapshot
         new_status = (self.pin_dt.value() << 1) | self.pin_clk.value()
-        if new_status == self._enc_last_status:
-            return
+        self._enc_irq_edge(PIN_DT if pin is self.pin_dt else PIN_CLK, new_status)
 
-        transition = (self._enc_last_status << 2) | new_status
+    def _enc_irq_edge(self, channel: int, new_status: int):
+        """_enc_irq_edge decodes an edge of the channel PIN_CLK or PIN_DT, new_status is (dt << 1) | clk read by the handler"""
+        last_status = self._enc_last_status
 
-        if self._sw_last_state:
-            self._sw_held_with_encoder = True
+        if self._recorder is not None:
+            self._recorder._enc_edge(channel, new_status)
+
+        stats = self._stats
+        if stats is not None:
+            if channel == PIN_DT:
+                stats.irq_dt += 1
+            else:
+                stats.irq_clk += 1
 
-        direction = 0
-        if transition == 0b1110:
-            direction = 1
-        elif transition == 0b1101:
-            direction = -1
+        # glitch filter, an edge too close to the previous one is a bounce, it is not counted,
+        # but the state follows the pins, so the edge after a spike decodes from the level it left.
+        # An edge after a pause longer than half the ticks_us period gives a negative diff, it is not short
+        if self.enc_glitch_us:
+            now_us = hal.ticks_us()
+            short = 0 <= hal.ticks_diff(now_us, self._enc_edge_us) < self.enc_glitch_us
+            self._enc_edge_us = now_us
+            if short:
+                self.enc_glitches += 1
+                if stats is not None:
+                    stats.enc_glitches += 1
+                self._enc_last_status = new_status
+                return
 
-        if direction != 0:
-            self._enc_process_event(direction)
+        if new_status == last_status:
+            if stats is not None:
+                stats.enc_ignored += 1
+            return
 
         self._enc_last_status = new_status
 
+        quarter = _ENC_TRANSITIONS[(last_status << 2) | new_status]
+        if quarter == _ENC_INVALID:
+            self.enc_invalid += 1
+            if stats is not None:
+                stats.enc_invalid += 1
+            self._enc_quarters = 0
+            return
+
+        quarters = self._enc_quarters + quarter
+
+        # not a stop of the current resolution, keep counting quarter steps
+        if not (self._enc_stops >> new_status) & 1:
+            self._enc_quarters = quarters
+            return
+
+        # a jitter around the stop sums up to zero and is not counted
+        self._enc_quarters = 0
+        if quarters >= self._enc_threshold:
+            self._enc_process_event(1)
+        elif quarters <= -self._enc_threshold:
+            self._enc_process_event(-1)
+
     def _enc_process_event(self, direction: int):
+        self._pos_value = self._pos_clamp(self._pos_value + direction * self._pos_step, self._pos_wrap)
+        self._irq_push(
+            _IRQ_TURN_RIGHT if direction > 0 else _IRQ_TURN_LEFT,
+            hal.ticks_us() if self.timebase_us else hal.ticks_ms(),
+        )
+
+    def _enc_tick_apply_step(self, direction: int, timestamp: int):
+        __interval = self._enc_interval
+        __idle = self._t_idle << _ENC_FIXED
+        __dt = hal.ticks_diff(timestamp, self._enc_last_event_ms)
+
+        # a long pause or a reversal starts the estimate over, the first interval after it seeds the average
+        if not 0 <= __dt < self._t_idle or direction != self._enc_last_step:
+            __interval = __idle
+        elif __interval >= __idle:
+            __interval = __dt << _ENC_FIXED
+        else:
+            __interval += ((__dt << _ENC_FIXED) - __interval) >> _ENC_EWMA_SHIFT
+
+        self._enc_interval = __interval
+        self._enc_last_step = direction
         self._enc_last_dir += direction
-        self._enc_last_event_ms = utime.ticks_ms()
+        self._enc_last_event_ms = timestamp
+
+        if (_SW_DOWN >> self._sw_state) & 1:
+            self._enc_burst_hold = True
+            self._sw_tick_input(_SW_IN_TURN, timestamp)
+
+        if self._t_fast == 0:
+            return
+
+        # hysteresis, a fast turn stays fast until the velocity drops below the exit threshold
+        __velocity = (self._t_second << _ENC_FIXED) // max(__interval, 1)
+        if self._enc_fast:
+            self._enc_fast = __velocity >= self.enc_fast_exit_sps
+        else:
+            self._enc_fast = __velocity >= self.enc_fast_sps
+
+        if self._enc_fast:
+            self._enc_burst_fast = True
 
     def _enc_tick_process_turn_event(self):
         # local cache
         __e_l_d = self._enc_last_dir
+        __fast = self._enc_burst_fast
+        __hold = self._enc_burst_hold
+        __step = self.enc_step
 
-        # @FIXME: It is a crunch, but it works for now
-        # 15ms it's a time for one step
-        if self.enc_fast_ms == 0:
-            fast_turn_count = 1000
-        else:
-            fast_turn_count = (self.enc_fast_ms // 15)
+        # whole enc_step units are delivered by TURN, the remainder is kept for the next turn
+        __delta = __e_l_d // __step if __e_l_d > 0 else -(-__e_l_d // __step)
+        self._enc_delta = __delta
 
-        if __e_l_d > 0:
-            if __e_l_d > fast_turn_count:
-                if self._sw_held_with_encoder:
+        # nobody listens to the turns and nothing counts them
+        if not self._listeners_mask & _EVENT_TURNS and self._stats is None:
+            pass
+        elif __e_l_d > 0:
+            if __fast:
+                if __hold:
                     self._flag_last_event = RotaryEncoderEvent.TURN_RIGHT_FAST_HOLD
                 else:
                     self._flag_last_event = RotaryEncoderEvent.TURN_RIGHT_FAST
             else:
-                if self._sw_held_with_encoder:
+                if __hold:
                     self._flag_last_event = RotaryEncoderEvent.TURN_RIGHT_HOLD
                 else:
                     self._flag_last_event = RotaryEncoderEvent.TURN_RIGHT
         else:
-            if __e_l_d < -fast_turn_count:
-                if self._sw_held_with_encoder:
+            if __fast:
+                if __hold:
                     self._flag_last_event = RotaryEncoderEvent.TURN_LEFT_FAST_HOLD
                 else:
                     self._flag_last_event = RotaryEncoderEvent.TURN_LEFT_FAST
             else:
-                if self._sw_held_with_encoder:
+                if __hold:
                     self._flag_last_event = RotaryEncoderEvent.TURN_LEFT_HOLD
                 else:
                     self._flag_last_event = RotaryEncoderEvent.TURN_LEFT
 
-        self._enc_last_dir = 0
+        self._enc_last_dir = __e_l_d - __delta * __step
+        self._enc_burst_fast = False
+        self._enc_burst_hold = False
 
-    def __encoder_has_event(self):
-        return self._enc_last_dir >= self.enc_step or self._enc_last_dir <= -self.enc_step
+    def _tick_drain_steps(self):
+        """_tick_drain_steps applies the steps counted by _irq_push while the ring was full, as one step at their last time"""
+        __state = hal.disable_irq()
+        __steps = self._irq_steps
+        __ts = self._irq_steps_ts
+        self._irq_steps = 0
+        hal.enable_irq(__state)
 
-    def __tick(self):
-        self._sw_tick_process_event()
+        __direction = 1 if __steps > 0 else -1
+        if self._sw_armed:
+            self._sw_tick_deadline(__ts)
+        self._enc_tick_settle(__ts)
+        self._enc_tick_apply_step(__direction, __ts)
+        self._enc_last_dir += __steps - __direction
 
-        if self.__encoder_has_event() and utime.ticks_diff(utime.ticks_ms(),
-                                                           self._enc_last_event_ms) > self.enc_fast_ms:
+    def _enc_has_event(self):
+        return self._enc_last_dir >= self.enc_step or self._enc_last_dir <= -self.enc_step
 
+    def _enc_tick_settle(self, timestamp: int):
+        if self._enc_has_event() and hal.ticks_diff(timestamp, self._enc_last_event_ms) > self._t_fast:
             self._enc_tick_process_turn_event()
-        if self._flag_last_event != 0:
+            self._tick_flush_event(timestamp)
+            self._flag_last_event = RotaryEncoderEvent.TURN
+            self._tick_flush_event(timestamp)
+
+    def _tick(self):
+        # an idle encoder returns here
+        if not self._tick_pending:
+            return
+
+        timestamp = self._ticks()
+
+        # only a deadline is armed and it is not due yet
+        if self._irq_head == self._irq_tail and hal.ticks_diff(timestamp, self._tick_deadline) < 0:
+            return
+
+        # local cache
+        __stats = self._stats
+        if __stats is not None:
+            __start_us = hal.ticks_us()
+
+        __kinds = self._irq_kinds
+        __timestamps = self._irq_timestamps
+        __mask = self._irq_mask
+        __tail = self._irq_tail
+        __head = self._irq_head
+
+        # replay the irq records in order, as if there was a tick right before each of them
+        while __tail != __head:
+            __kind = __kinds[__tail]
+            __ts = __timestamps[__tail]
+            __tail = (__tail + 1) & __mask
+
+            if self._sw_armed:
+                self._sw_tick_deadline(__ts)
+
+            if __kind <= _IRQ_TURN_LEFT:
+                self._enc_tick_settle(__ts)
+                self._enc_tick_apply_step(1 if __kind == _IRQ_TURN_RIGHT else -1, __ts)
+            else:
+                self._sw_tick_input(_SW_IN_PRESS if __kind == _IRQ_SW_PRESSED else _SW_IN_RELEASE, __ts)
+
+        self._irq_tail = __tail
+
+        # the steps dropped by the full ring came after its records, they are applied at once
+        if self._irq_steps:
+            self._tick_drain_steps()
+
+        # an idle button costs this one check
+        if self._sw_armed:
+            self._sw_tick_deadline(timestamp)
+        self._enc_tick_settle(timestamp)
+
+        # a throttled listener owes a call
+        if self._thr_armed and hal.ticks_diff(timestamp, self._thr_deadline) >= 0:
+            self._throttle_due()
+
+        self._tick_arm()
+
+        if __stats is not None:
+            __stats._tick_done(hal.ticks_diff(hal.ticks_us(), __start_us))
+
+    def _tick_arm(self):
+        """_tick_arm finds the nearest deadline of the state machines, the next ticks skip everything until it"""
+        __armed = False
+
+        # a turn fires after the pause of fast_ms
+        if self._enc_has_event():
+            __armed = True
+            self._tick_deadline = hal.ticks_add(self._enc_last_event_ms, self._t_fast + 1)
+
+        # the button waits for its deadline: the end of a click, the hold, the end of the multiple click window
+        if self._sw_armed and (not __armed or hal.ticks_diff(self._sw_deadline, self._tick_deadline) < 0):
+            __armed = True
+            self._tick_deadline = self._sw_deadline
+
+        # a throttled listener waits for its call
+        if self._thr_armed and (not __armed or hal.ticks_diff(self._thr_deadline, self._tick_deadline) < 0):
+            __armed = True
+            self._tick_deadline = self._thr_deadline
+
+        self._tick_armed = __armed
+        self._tick_pending = __armed
+        # an irq record pushed meanwhile, its handler may have set the flag before it was cleared above
+        if self._irq_head != self._irq_tail:
+            self._tick_pending = True
+
+    def _tick_timeout(self) -> int:
+        """_tick_timeout returns the ms until a tick is due without a new edge, -1 if only an edge can change anything"""
+        if not self._tick_armed:
+            return -1
+
+        __timeout = max(hal.ticks_diff(self._tick_deadline, self._ticks()), 0)
+
+        # rounded up to whole ms, a tick a little late is fine, a tick too early is a wasted wakeup
+        if self.timebase_us and __timeout > 0:
+            __timeout = (__timeout + 999) // 1000
+
+        return __timeout
+
+    def _defer_dispatch(self, size: int):
+        """_defer_dispatch makes the tick queue the events instead of calling the listeners, see _dispatch"""
+        size = _ring_size(size)
+        self._evq_ids = bytearray(size)
+        self._evq_args = array("i", [0] * size)
+        self._evq_timestamps = array("i", [0] * size)
+        self._evq_velocities = array("i", [0] * size)
+        self._evq_mask = size - 1
+        self._evq_head = 0
+        self._evq_tail = 0
+
+    def _direct_dispatch(self):
+        """_direct_dispatch calls the listeners of the queued events and makes the tick call them again, undoes _defer_dispatch"""
+        if self._evq_ids is not None:
+            self._dispatch()
+            self._evq_ids = None
+            self._evq_args = None
+            self._evq_timestamps = None
+            self._evq_velocities = None
+            self._evq_mask = 0
+            self._evq_head = 0
+            self._evq_tail = 0
+
+    def _dispatch(self):
+        """_dispatch calls the listeners of the events queued by the tick"""
+        __tail = self._evq_tail
+        __head = self._evq_head
+
+        while __tail != __head:
             try:
-                self.__call_listeners()
+                if self._evq_ids[__tail] == _EVENT_THROTTLED:
+                    self._throttle_flush()
+                else:
+                    self._call_listeners(
+                        self._evq_ids[__tail],
+                        self._evq_args[__tail],
+                        self._evq_timestamps[__tail],
+                        self._evq_velocities[__tail],
+                    )
             except Exception as e:
-                print(f"RotaryEncoder call listeners error: {e}")
+                self._dispatch_error(self._evq_ids[__tail], e)
+            __tail = (__tail + 1) & self._evq_mask
+            self._evq_tail = __tail
+
+    def _tick_flush_event(self, timestamp: int):
+        __l_e = self._flag_last_event
+
+        if __l_e != 0:
+            if self._stats is not None:
+                self._stats.events[__l_e] += 1
+
+            # the value of the event: the clicks of MULTIPLE_CLICK(_HELD), the signed steps of the turns
+            __turn = (_EVENT_DELTA >> __l_e) & 1
+            if __turn:
+                __value = self._enc_delta
+            elif __l_e == RotaryEncoderEvent.MULTIPLE_CLICK or __l_e == RotaryEncoderEvent.MULTIPLE_CLICK_HELD:
+                __value = self._sw_clicks
+            else:
+                __value = 0
+
+            # the events nobody listens to are dropped here
+            if (self._listeners_mask >> __l_e) & 1:
+                if self._events is not None and (_EVENT_STREAM >> __l_e) & 1:
+                    if __turn:
+                        self._events._push(__l_e, 0, __value, timestamp)
+                    else:
+                        self._events._push(__l_e, __value, 0, timestamp)
 
-            if self._flag_last_event == RotaryEncoderEvent.MULTIPLE_CLICK:
-                self._sw_clicks = 0
+                # the velocity as of the last step of the turn, only the context listeners get it
+                __velocity = 0
+                if __turn and (self._ctx_mask >> __l_e) & 1 and self._enc_interval < self._t_idle << _ENC_FIXED:
+                    __velocity = self._enc_last_step * (self._t_second << _ENC_FIXED) // max(self._enc_interval, 1)
+
+                if self._evq_ids is None:
+                    try:
+                        self._call_listeners(__l_e, __value, timestamp, __velocity)
+                    except Exception as e:
+                        self._dispatch_error(__l_e, e)
+                else:
+                    __head = self._evq_head
+                    __next_head = (__head + 1) & self._evq_mask
+                    if __next_head == self._evq_tail:
+                        self.event_overflow += 1
+                    else:
+                        self._evq_ids[__head] = __l_e
+                        self._evq_args[__head] = __value
+                        self._evq_timestamps[__head] = timestamp
+                        self._evq_velocities[__head] = __velocity
+                        self._evq_head = __next_head
 
             self._flag_last_event = 0
 
-    def __call_listeners(self):
+    def _call_listeners(self, event: int, value: int, timestamp: int, velocity: int):
         # local cache
-        __l_e = self._flag_last_event
+        __list = self._listeners
+        __stats = self._stats
 
-        if __l_e != 0:
-            # local cache
-            __sw_c = self._sw_clicks
-            __e_e = RotaryEncoderEvent.ANY
-            __m_c_e = RotaryEncoderEvent.MULTIPLE_CLICK
-            __list = self._listeners
-
-            if __l_e in __list:
-                for __l in __list[__l_e]:
+        if __stats is not None:
+            __start_us = hal.ticks_us()
+
+        # the argument (clicks or delta) is chosen once per event, not per listener,
+        # the classified turns carry their delta only for the context listeners
+        if (_EVENT_ARGS >> event) & 1:
+            __arg = value
+            for __l in __list[event]:
+                try:
+                    __l(__arg)
+                except Exception as e:
+                    self._listener_error(event, __l, e)
+        else:
+            __arg = 0
+            for __l in __list[event]:
+                try:
+                    __l()
+                except Exception as e:
+                    self._listener_error(event, __l, e)
+
+        for __l in __list[RotaryEncoderEvent.ANY]:
+            try:
+                __l(event, __arg)
+            except Exception as e:
+                self._listener_error(RotaryEncoderEvent.ANY, __l, e)
+
+        # the context is filled once per event, in place, for all the context listeners
+        if (self._ctx_mask >> event) & 1:
+            __ctx = self._ctx
+            __ctx.event = event
+            __ctx.timestamp = timestamp
+            __ctx.velocity = velocity
+            if (_EVENT_DELTA >> event) & 1:
+                __ctx.delta = value
+                __ctx.clicks = 0
+            else:
+                __ctx.delta = 0
+                __ctx.clicks = value
+
+            for __l in self._ctx_listeners[event]:
+                try:
+                    __l(__ctx)
+                except Exception as e:
+                    self._listener_error(event, __l, e)
+            for __l in self._ctx_listeners[RotaryEncoderEvent.ANY]:
+                try:
+                    __l(__ctx)
+                except Exception as e:
+                    self._listener_error(RotaryEncoderEvent.ANY, __l, e)
+
+        # the listeners with a delivery policy, a call they owe is made by _throttle_flush once it is due
+        if self._throttled:
+            __now = self._ticks()
+            for __t in self._throttled:
+                if __t.event == event or __t.event == RotaryEncoderEvent.ANY:
                     try:
-                        if __l_e == __m_c_e:
-                            __l(__sw_c)
-                        else:
-                            __l()
+                        if __t.offer(event, __arg, __now):
+                            self._throttle_arm(__t.deadline)
                     except Exception as e:
-                        print(f"RotaryEncoder callback error. Event: {__l_e}, Listener: {__l}, Error: {e}")
-            if __e_e in __list:
-                for __l in __list[__e_e]:
+                        self._listener_error(__t.event, __t.callback, e)
+
+        if __stats is not None:
+            __stats._dispatch_done(hal.ticks_diff(hal.ticks_us(), __start_us))
+
+    def _throttle_arm(self, deadline: int):
+        """_throttle_arm makes the tick wake up at the deadline of a throttled listener"""
+        # the listeners may run outside of the interrupt which ticks, the deadlines must change together
+        __state = hal.disable_irq()
+        if not self._thr_armed or hal.ticks_diff(deadline, self._thr_deadline) < 0:
+            self._thr_armed = True
+            self._thr_deadline = deadline
+        if not self._tick_armed or hal.ticks_diff(deadline, self._tick_deadline) < 0:
+            self._tick_armed = True
+            self._tick_deadline = deadline
+        self._tick_pending = True
+        hal.enable_irq(__state)
+
+        # an event driven tick or a group sleeps until it is told, it takes the new deadline on its next tick
+        if self._irq_flag is not None:
+            self._irq_flag.set()
+
+    def _throttle_due(self):
+        """_throttle_due is called by the tick at the deadline, the due calls are made where the listeners are called"""
+        self._thr_armed = False
+
+        if self._evq_ids is None:
+            self._throttle_flush()
+            return
+
+        __head = self._evq_head
+        __next_head = (__head + 1) & self._evq_mask
+        if __next_head == self._evq_tail:
+            self.event_overflow += 1
+        else:
+            self._evq_ids[__head] = _EVENT_THROTTLED
+            self._evq_args[__head] = 0
+            self._evq_head = __next_head
+
+    def _throttle_flush(self):
+        """_throttle_flush makes the calls owed by the throttled listeners which are due, re-arms the others"""
+        __now = self._ticks()
+        for __t in self._throttled:
+            if __t.pending:
+                if hal.ticks_diff(__now, __t.deadline) >= 0:
                     try:
-                        if __l_e == __m_c_e:
-                            __l(__l_e, __sw_c)
-                        else:
-                            __l(__l_e, 0)
+                        __t.deliver(__now)
                     except Exception as e:
-                        print(f"RotaryEncoder callback error. Event: {__e_e}, Listener: {__l}, Error: {e}")
+                        self._listener_error(__t.event, __t.callback, e)
+                else:
+                    self._throttle_arm(__t.deadline)
+
+    def _listener_error(self, event: int, listener: callable, error: Exception):
+        if self._stats is not None:
+            self._stats.listener_errors += 1
+        self.last_error = error
+        self.last_error_event = event
+        # the parts are printed one by one, formatting them into one string would allocate
+        print("RotaryEncoder callback error. Event:", event, "Listener:", listener, "Error:", error)
+
+    def _dispatch_error(self, event: int, error: Exception):
+        self.last_error = error
+        self.last_error_event = event
+        print("RotaryEncoder call listeners error:", error)
+
+
+# the hot paths compiled by the native emitter, see rotary_encoder_native.py,
+# CPython and a port built without the emitter keep the bytecode methods above,
+# as does a port whose emitter fails on the module in any other way (e.g. a ValueError of viper)
+try:
+    from . import rotary_encoder_native as _native
+except Exception:
+    _native = None
+
+NATIVE = _native is not None
+"NATIVE is True when the native variants of the hot paths are in use"
+
+if NATIVE:
+    RotaryEncoder._enc_irq_edge = _native._enc_irq_edge
+    RotaryEncoder._enc_tick_process_turn_event = _native._enc_tick_process_turn_event
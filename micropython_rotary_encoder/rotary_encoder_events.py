@@ -0,0 +1,161 @@
+from array import array
+
+from . import hal
+from .rotary_encoder import _ring_size
+
+
+class RotaryEncoderEventStream:
+    """
+        RotaryEncoderEventStream is an asynchronous iterator over the events of an encoder,
+        created by RotaryEncoder.events(). The tick puts the events into a bounded queue
+        allocated once, the consumer task takes them at its own pace:
+
+            async for event_id, clicks, delta, timestamp in encoder.events():
+                ...
+    """
+
+    DROP_NEWEST = 0
+    "a full queue drops the new event"
+    DROP_OLDEST = 1
+    "a full queue drops its oldest event to make room for the new one"
+
+    __slots__ = (
+        "overflow",
+        "overflow_policy",
+        "_encoder",
+        "_ids",
+        "_clicks",
+        "_deltas",
+        "_timestamps",
+        "_mask",
+        "_head",
+        "_tail",
+        "_flag",
+    )
+
+    overflow: int
+    "attribute RotaryEncoderEventStream.overflow counts the events dropped because the queue was full"
+
+    overflow_policy: int
+    "attribute RotaryEncoderEventStream.overflow_policy is DROP_NEWEST or DROP_OLDEST"
+
+    _encoder: object
+
+    _ids: bytearray
+
+    _clicks: array
+
+    _deltas: array
+
+    _timestamps: array
+
+    _mask: int
+
+    _head: int
+
+    _tail: int
+
+    _flag: object
+
+    def __init__(self, encoder, size: int = 16, overflow: int = DROP_OLDEST):
+        self.overflow = 0
+        self.overflow_policy = overflow
+        self._encoder = encoder
+
+        __size = _ring_size(size)
+        self._ids = bytearray(__size)
+        self._clicks = array("i", [0] * __size)
+        self._deltas = array("i", [0] * __size)
+        self._timestamps = array("i", [0] * __size)
+        self._mask = __size - 1
+        self._head = 0
+        self._tail = 0
+        self._flag = hal.asyncio.ThreadSafeFlag()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> tuple:
+        while self._head == self._tail:
+            if self._encoder is None:
+                raise StopAsyncIteration
+            await self._flag.wait()
+
+        # the tick may run in an interrupt and drop the oldest record meanwhile
+        __state = hal.disable_irq()
+        __tail = self._tail
+        __record = (self._ids[__tail], self._clicks[__tail], self._deltas[__tail], self._timestamps[__tail])
+        self._tail = (__tail + 1) & self._mask
+        hal.enable_irq(__state)
+
+        return __record
+
+    def pending(self) -> int:
+        """pending returns the number of the queued events"""
+        return (self._head - self._tail) & self._mask
+
+    def close(self):
+        """close detaches the stream from the encoder, the iteration ends once the queued events are taken"""
+        if self._encoder is not None:
+            self._encoder._events_close(self)
+            self._encoder = None
+            self._flag.set()
+
+    def _push(self, event: int, clicks: int, delta: int, timestamp: int):
+        __head = self._head
+        __next_head = (__head + 1) & self._mask
+
+        if __next_head == self._tail:
+            self.overflow += 1
+            if self.overflow_policy == self.DROP_NEWEST:
+                return
+            self._tail = (self._tail + 1) & self._mask
+
+        self._ids[__head] = event
+        self._clicks[__head] = clicks
+        self._deltas[__head] = delta
+        self._timestamps[__head] = timestamp
+        self._head = __next_head
+
+        self._flag.set()
+
+
+class RotaryEncoderEventContext:
+    """
+        RotaryEncoderEventContext is the single argument of the listeners subscribed with
+        RotaryEncoder.on(event, callback, context=True). There is one per encoder, allocated by the first
+        such subscription, it is filled in place for every event, so a listener must copy what it keeps:
+
+            def on_turn(ctx):
+                print(ctx.event, ctx.timestamp, ctx.delta, ctx.velocity, ctx.clicks)
+    """
+
+    __slots__ = (
+        "event",
+        "timestamp",
+        "delta",
+        "velocity",
+        "clicks",
+    )
+
+    event: int
+    "attribute RotaryEncoderEventContext.event is the id of the event, see RotaryEncoderEvent"
+
+    timestamp: int
+    "attribute RotaryEncoderEventContext.timestamp is the time of the event in the timebase units (ms, or us with timebase_us)"
+
+    delta: int
+    "attribute RotaryEncoderEventContext.delta is the signed steps of a turn event, 0 for the others"
+
+    velocity: int
+    "attribute RotaryEncoderEventContext.velocity is the turn velocity in steps per second of a turn event, 0 for the others"
+
+    clicks: int
+    "attribute RotaryEncoderEventContext.clicks is the clicks of MULTIPLE_CLICK and MULTIPLE_CLICK_HELD, 0 for the others"
+
+    def __init__(self):
+        self.event = 0
+        self.timestamp = 0
+        self.delta = 0
+        self.velocity = 0
+        self.clicks = 0
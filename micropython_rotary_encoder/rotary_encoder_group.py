@@ -0,0 +1,302 @@
+from . import hal
+from .rotary_encoder import RotaryEncoder
+from .rotary_encoder_rp2 import RotaryEncoderRP2
+
+
+class _RotaryEncoderGroupMember:
+    """Notifier given to a member encoder, its irq handlers call set() on every ring buffer record"""
+
+    __slots__ = (
+        "group",
+        "bit",
+    )
+
+    def __init__(self, group, bit: int):
+        self.group = group
+        self.bit = bit
+
+    def set(self):
+        group = self.group
+        group._dirty |= self.bit
+        if group._flag is not None:
+            group._flag.set()
+
+
+class RotaryEncoderGroup:
+    """
+        RotaryEncoderGroup services many encoders from one tick loop or timer.
+        The irq handlers of a member mark it dirty, the tick skips the members
+        which have neither a new edge nor a due timeout, so its cost scales with the
+        number of active encoders, not with the number of registered ones.
+    """
+
+    MAX_MEMBERS = 30
+    "the dirty bitmask must stay a small int"
+
+    __slots__ = (
+        "alive",
+        "timer",
+        "wakeups",
+        "timer_tick_us",
+        "timer_tick_max_us",
+        "schedule_overflow",
+        "_members",
+        "_deadlines",
+        "_dirty",
+        "_armed",
+        "_flag",
+        "_queued",
+        "_dispatch_mode",
+        "_dispatch_size",
+        "_dispatch_scheduled",
+        "_dispatch_ref",
+    )
+
+    alive: bool
+
+    timer: "Timer"
+
+    wakeups: int
+    "attribute RotaryEncoderGroup.wakeups counts the ticks run by async_event_tick"
+
+    timer_tick_us: int
+    "attribute RotaryEncoderGroup.timer_tick_us is the time spent in the timer interrupt by the last tick"
+
+    timer_tick_max_us: int
+    "attribute RotaryEncoderGroup.timer_tick_max_us is the longest time spent in the timer interrupt by a tick"
+
+    schedule_overflow: int
+    "attribute RotaryEncoderGroup.schedule_overflow counts the failed micropython.schedule calls (queue full)"
+
+    _members: list
+
+    _deadlines: list
+
+    _dirty: int
+
+    _armed: int
+
+    _flag: object
+
+    _queued: bool
+
+    _dispatch_mode: int
+
+    _dispatch_size: int
+
+    _dispatch_scheduled: bool
+
+    _dispatch_ref: callable
+
+    def __init__(self, *encoders: RotaryEncoder):
+        self.alive = True
+        self.timer = None
+        self.wakeups = 0
+        self.timer_tick_us = 0
+        self.timer_tick_max_us = 0
+        self.schedule_overflow = 0
+        self._members = []
+        self._deadlines = []
+        # bit n is set by the irq handlers of the member n, the tick clears it
+        self._dirty = 0
+        # bit n is set while the member n waits for a timeout, its time is in _deadlines[n]
+        self._armed = 0
+        self._flag = None
+        self._queued = False
+        self._dispatch_mode = RotaryEncoderRP2.DISPATCH_IRQ
+        # the deferred dispatch queue size of the members, a member added later gets one too
+        self._dispatch_size = 0
+        self._dispatch_scheduled = False
+        self._dispatch_ref = self._scheduled_dispatch
+
+        for encoder in encoders:
+            self.add(encoder)
+
+    def deinit(self):
+        """deinit stops the timer of timer_tick and ends the tick loops, the members stay registered"""
+        self.alive = False
+
+        if self.timer is not None:
+            self.timer.deinit()
+            self.timer = None
+
+    def add(self, encoder: RotaryEncoder):
+        """add registers the encoder, it must not be ticked by itself anymore"""
+        if encoder._irq_flag is not None:
+            raise ValueError("RotaryEncoderGroup: the encoder is already ticked by an event driven tick or group")
+
+        if None in self._members:
+            index = self._members.index(None)
+        elif len(self._members) < self.MAX_MEMBERS:
+            index = len(self._members)
+            self._members.append(None)
+            self._deadlines.append(0)
+        else:
+            raise ValueError("RotaryEncoderGroup: too many encoders")
+
+        self._members[index] = encoder
+        encoder._irq_flag = _RotaryEncoderGroupMember(self, 1 << index)
+        # after timer_tick the listeners of a new member must not run in the timer interrupt either
+        if self._dispatch_mode != RotaryEncoderRP2.DISPATCH_IRQ:
+            encoder._defer_dispatch(self._dispatch_size)
+        # the encoder may have records from before
+        self._dirty |= 1 << index
+
+    def remove(self, encoder: RotaryEncoder):
+        """remove unregisters the encoder"""
+        index = self._members.index(encoder)
+        bit = 1 << index
+
+        encoder._irq_flag = None
+        self._members[index] = None
+        # ticked by itself again, the encoder calls its listeners from its own tick
+        encoder._direct_dispatch()
+
+        state = hal.disable_irq()
+        self._dirty &= ~bit
+        hal.enable_irq(state)
+        self._armed &= ~bit
+
+    async def async_tick(self, timeout=1):
+        """async_tick is used to process the events of all the encoders. It should be run by asyncio."""
+        self._direct_mode()
+        asyncio = hal.asyncio
+        while self.alive:
+            self._tick()
+            await asyncio.sleep_ms(timeout)
+
+    async def async_event_tick(self):
+        """
+            async_event_tick is used to process the events of all the encoders. It should be run by asyncio.
+            It sleeps until the next pin edge of any encoder or the next pending timeout.
+        """
+        self._direct_mode()
+        asyncio = hal.asyncio
+        flag = asyncio.ThreadSafeFlag()
+        self._flag = flag
+
+        try:
+            while self.alive:
+                self.wakeups += 1
+
+                timeout = self._tick()
+                if timeout < 0:
+                    await flag.wait()
+                elif timeout == 0:
+                    await asyncio.sleep_ms(0)
+                else:
+                    try:
+                        await asyncio.wait_for_ms(flag.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            self._flag = None
+
+    def timer_tick(self, timeout=1, dispatch=RotaryEncoderRP2.DISPATCH_IRQ, queue_size=16):
+        """
+            timer_tick is used to process the events of all the encoders. It creates one system irq timer,
+            a new call replaces the timer of the previous one.
+            dispatch is one of RotaryEncoderRP2.DISPATCH_*, as for RotaryEncoderRP2.timer_tick.
+        """
+        if self.timer is not None:
+            self.timer.deinit()
+
+        if dispatch == RotaryEncoderRP2.DISPATCH_IRQ:
+            self._direct_mode()
+        else:
+            self._dispatch_mode = dispatch
+            self._dispatch_size = queue_size
+            for encoder in self._members:
+                if encoder is not None:
+                    encoder._defer_dispatch(queue_size)
+
+        self.timer = hal.Timer(-1, period=timeout, mode=hal.Timer.PERIODIC, callback=self._timer_callback)
+
+    def raw_tick(self):
+        """raw_tick is used to process the events of all the encoders. It should be run by the main loop manually."""
+        if self._dispatch_mode != RotaryEncoderRP2.DISPATCH_IRQ:
+            self._direct_mode()
+        self._tick()
+
+    def dispatch(self):
+        """dispatch calls the listeners of the events queued by timer_tick"""
+        self._queued = False
+        for encoder in self._members:
+            if encoder is not None and encoder._evq_head != encoder._evq_tail:
+                encoder._dispatch()
+
+    def _direct_mode(self):
+        """_direct_mode makes the tick call the listeners again, after a timer_tick which queued the events"""
+        self._dispatch_mode = RotaryEncoderRP2.DISPATCH_IRQ
+        self._dispatch_size = 0
+        self._queued = False
+        for encoder in self._members:
+            if encoder is not None:
+                encoder._direct_dispatch()
+
+    def _timer_callback(self, timer):
+        start = hal.ticks_us()
+
+        self._tick()
+
+        if (
+                self._dispatch_mode == RotaryEncoderRP2.DISPATCH_SCHEDULE
+                and self._queued
+                and not self._dispatch_scheduled
+        ):
+            try:
+                hal.schedule(self._dispatch_ref, 0)
+                self._dispatch_scheduled = True
+            except RuntimeError:
+                self.schedule_overflow += 1
+
+        spent = hal.ticks_diff(hal.ticks_us(), start)
+        self.timer_tick_us = spent
+        if spent > self.timer_tick_max_us:
+            self.timer_tick_max_us = spent
+
+    def _scheduled_dispatch(self, _):
+        self._dispatch_scheduled = False
+        self.dispatch()
+
+    def _tick(self) -> int:
+        """_tick ticks the dirty and the due members, returns the ms until the nearest timeout or -1"""
+        state = hal.disable_irq()
+        dirty = self._dirty
+        self._dirty = 0
+        hal.enable_irq(state)
+
+        active = dirty | self._armed
+        if not active:
+            return -1
+
+        timestamp = hal.ticks_ms()
+        nearest = -1
+        index = 0
+        bit = 1
+
+        while active:
+            if active & 1:
+                left = hal.ticks_diff(self._deadlines[index], timestamp)
+
+                if dirty & bit or left <= 0:
+                    encoder = self._members[index]
+                    encoder._tick()
+                    if encoder._evq_head != encoder._evq_tail:
+                        self._queued = True
+
+                    left = encoder._tick_timeout()
+                    if left < 0:
+                        self._armed &= ~bit
+                    else:
+                        self._armed |= bit
+                        self._deadlines[index] = hal.ticks_add(timestamp, left)
+
+                if left >= 0 and (nearest < 0 or left < nearest):
+                    nearest = left
+
+            active >>= 1
+            index += 1
+            bit <<= 1
+
+        return nearest
@@ -0,0 +1,128 @@
+"""
+Native variants of the hot paths of RotaryEncoder: the quadrature decoder, the decoding of an encoder edge
+in the irq handlers and the classification of a turn in the tick.
+
+The module compiles only with the native emitter of MicroPython (``micropython.native``,
+``micropython.viper``). rotary_encoder imports it after RotaryEncoder is defined and swaps in the
+functions below. On CPython, and on a port built without the emitter, the import fails and
+the bytecode methods of RotaryEncoder stay. Both must give the same events, see benchmarks/bench_native.py.
+"""
+
+import micropython
+from micropython import const
+
+from . import hal
+from .rotary_encoder import RotaryEncoderEvent, PIN_DT, _EVENT_TURNS
+
+# results of _enc_decode, in the low two bits, the quarter steps counted so far are above them
+_DECODE_COUNT = const(0)
+_DECODE_RIGHT = const(1)
+_DECODE_LEFT = const(2)
+_DECODE_INVALID = const(3)
+
+
+@micropython.viper
+def _enc_decode(last_status: int, new_status: int, quarters: int, stops: int, threshold: int) -> int:
+    """
+        _enc_decode is the quadrature decoder of RotaryEncoder._enc_irq_edge without the table.
+        The gray code state (dt << 1) | clk becomes the position 0..3 of the quadrature cycle,
+        the difference of two positions is the quarter step: 1 clockwise, 3 counterclockwise, 2 invalid.
+    """
+    __old = (last_status & 2) | (((last_status >> 1) ^ last_status) & 1)
+    __new = (new_status & 2) | (((new_status >> 1) ^ new_status) & 1)
+    __quarter = (__new - __old) & 3
+
+    if __quarter == 2:
+        return _DECODE_INVALID
+    if __quarter == 3:
+        __quarter = -1
+
+    __quarters = quarters + __quarter
+
+    # not a stop of the current resolution, keep counting quarter steps
+    if not (stops >> new_status) & 1:
+        return __quarters << 2
+
+    # a jitter around the stop sums up to zero and is not counted
+    if __quarters >= threshold:
+        return _DECODE_RIGHT
+    if __quarters <= 0 - threshold:
+        return _DECODE_LEFT
+    return _DECODE_COUNT
+
+
+@micropython.viper
+def _enc_turn_event(direction: int, fast: int, hold: int) -> int:
+    """_enc_turn_event returns TURN_LEFT ... TURN_RIGHT_FAST_HOLD, they are laid out as (right << 2) | (hold << 1) | fast"""
+    __event = int(RotaryEncoderEvent.TURN_LEFT) + fast + (hold << 1)
+    if direction > 0:
+        __event += 4
+    return __event
+
+
+@micropython.native
+def _enc_irq_edge(self, channel: int, new_status: int):
+    last_status = self._enc_last_status
+
+    if self._recorder is not None:
+        self._recorder._enc_edge(channel, new_status)
+
+    stats = self._stats
+    if stats is not None:
+        if channel == PIN_DT:
+            stats.irq_dt += 1
+        else:
+            stats.irq_clk += 1
+
+    # glitch filter, an edge too close to the previous one is a bounce, it is not counted,
+    # but the state follows the pins, see RotaryEncoder._enc_irq_edge
+    if self.enc_glitch_us:
+        now_us = hal.ticks_us()
+        short = 0 <= hal.ticks_diff(now_us, self._enc_edge_us) < self.enc_glitch_us
+        self._enc_edge_us = now_us
+        if short:
+            self.enc_glitches += 1
+            if stats is not None:
+                stats.enc_glitches += 1
+            self._enc_last_status = new_status
+            return
+
+    if new_status == last_status:
+        if stats is not None:
+            stats.enc_ignored += 1
+        return
+
+    self._enc_last_status = new_status
+
+    result = _enc_decode(last_status, new_status, self._enc_quarters, self._enc_stops, self._enc_threshold)
+    code = result & 3
+    if code == _DECODE_INVALID:
+        self.enc_invalid += 1
+        if stats is not None:
+            stats.enc_invalid += 1
+        self._enc_quarters = 0
+        return
+
+    self._enc_quarters = result >> 2
+    if code == _DECODE_RIGHT:
+        self._enc_process_event(1)
+    elif code == _DECODE_LEFT:
+        self._enc_process_event(-1)
+
+
+@micropython.native
+def _enc_tick_process_turn_event(self):
+    __e_l_d = self._enc_last_dir
+    __step = self.enc_step
+
+    # whole enc_step units are delivered by TURN, the remainder is kept for the next turn
+    __delta = __e_l_d // __step if __e_l_d > 0 else -(-__e_l_d // __step)
+    self._enc_delta = __delta
+
+    # unless nobody listens to the turns and nothing counts them
+    if self._listeners_mask & _EVENT_TURNS or self._stats is not None:
+        self._flag_last_event = _enc_turn_event(__e_l_d, self._enc_burst_fast, self._enc_burst_hold)
+
+    self._enc_last_dir = __e_l_d - __delta * __step
+    self._enc_burst_fast = False
+    self._enc_burst_hold = False
@@ -0,0 +1,181 @@
+"""
+Capture of the raw pin transitions seen by the irq handlers, and their replay on a host.
+
+A record is a little-endian 32-bit word:
+
+- bits 0-1: the pin, ``PIN_CLK``, ``PIN_DT`` or ``PIN_SW``
+- bit 2: the pin level
+- bit 3: the level changed without an interrupt of its own (seen by the interrupt of the other encoder pin)
+- bits 4-29: the microseconds since the previous record, longer pauses are clamped to ``MAX_DELTA_US``
+
+The word stays below 2**30, so recording allocates nothing on MicroPython.
+"""
+
+from array import array
+
+from . import hal
+from .rotary_encoder import PIN_CLK, PIN_DT, PIN_SW, _ring_size
+
+_LEVEL = 0b0100
+_SILENT = 0b1000
+_DELTA_SHIFT = 4
+
+MAX_DELTA_US = (1 << 26) - 1
+"the longest pause a record holds, about 67 s"
+
+
+class RotaryEncoderRecorder:
+    """
+        RotaryEncoderRecorder captures the pin transitions of an encoder into a preallocated ring of records:
+
+            recorder = RotaryEncoderRecorder(1024)
+            encoder.record(recorder)
+            ...
+            recorder.save("capture.bin")
+
+        The main loop can also write the records out while recording with flush(file).
+    """
+
+    __slots__ = (
+        "overflow",
+        "_records",
+        "_mask",
+        "_head",
+        "_tail",
+        "_levels",
+        "_last_us",
+    )
+
+    overflow: int
+    "attribute RotaryEncoderRecorder.overflow counts the records dropped because the ring was full"
+
+    _records: array
+
+    _mask: int
+
+    _head: int
+
+    _tail: int
+
+    _levels: int
+
+    _last_us: int
+
+    def __init__(self, size: int = 1024):
+        self.overflow = 0
+
+        __size = _ring_size(size)
+        self._records = array("I", [0] * __size)
+        self._mask = __size - 1
+        self._head = 0
+        self._tail = 0
+        # the last recorded level of every pin, bit n is the pin n
+        self._levels = 0
+        self._last_us = None
+
+    def start(self, levels: int):
+        """start begins a capture, levels is the bitmask of the current pin levels, bit n is the pin n"""
+        self._levels = levels
+        self._last_us = None
+
+    def pending(self) -> int:
+        """pending returns the number of the records not written out yet"""
+        return (self._head - self._tail) & self._mask
+
+    def flush(self, stream) -> int:
+        """flush writes the pending records to a binary stream, returns the number of the written records"""
+        __head = self._head
+        __tail = self._tail
+        __view = memoryview(self._records)
+        __count = (__head - __tail) & self._mask
+
+        if __head < __tail:
+            stream.write(__view[__tail:])
+            __tail = 0
+        stream.write(__view[__tail:__head])
+
+        self._tail = __head
+        return __count
+
+    def save(self, path: str) -> int:
+        """save writes the pending records to a file, returns the number of the written records"""
+        with open(path, "wb") as f:
+            return self.flush(f)
+
+    def _record(self, pin: int, level: int, silent: bool):
+        __now = hal.ticks_us()
+        __delta = 0 if self._last_us is None else hal.ticks_diff(__now, self._last_us)
+        self._last_us = __now
+
+        if __delta > MAX_DELTA_US:
+            __delta = MAX_DELTA_US
+        elif __delta < 0:
+            __delta = 0
+
+        __head = self._head
+        __next_head = (__head + 1) & self._mask
+        if __next_head == self._tail:
+            self.overflow += 1
+            return
+
+        __word = (__delta << _DELTA_SHIFT) | pin
+        if level:
+            __word |= _LEVEL
+            self._levels |= 1 << pin
+        else:
+            self._levels &= ~(1 << pin)
+        if silent:
+            __word |= _SILENT
+
+        self._records[__head] = __word
+        self._head = __next_head
+
+    def _enc_edge(self, trigger: int, status: int):
+        """_enc_edge records an interrupt of the encoder pin trigger, status is (dt << 1) | clk as read by the handler"""
+        __other = PIN_CLK if trigger == PIN_DT else PIN_DT
+        __other_level = (status >> __other) & 1
+
+        # the other pin changed too, its edge was missed
+        if __other_level != (self._levels >> __other) & 1:
+            self._record(__other, __other_level, True)
+
+        self._record(trigger, (status >> trigger) & 1, False)
+
+
+def records(data):
+    """records yields the (delta_us, pin, level, silent) of every record of a capture"""
+    for i in range(0, len(data) - 3, 4):
+        __word = int.from_bytes(data[i:i + 4], "little")
+        yield (
+            __word >> _DELTA_SHIFT,
+            __word & 0b11,
+            1 if __word & _LEVEL else 0,
+            bool(__word & _SILENT),
+        )
+
+
+def replay(data, pins, speed: float = 1, clock=None) -> int:
+    """
+        replay feeds a capture to an encoder created on ``sim.SimPin`` pins, returns the number of the records.
+        The virtual clock is advanced between the records, so a timer_tick of the encoder runs as on the board.
+        :param data: the bytes of a capture
+        :param pins: the (clk, dt, sw) pins of the encoder
+        :param speed: 2 replays twice as fast, the pauses are divided by it
+        :param clock: the virtual clock, sim.clock by default
+    """
+    if clock is None:
+        from . import sim
+
+        clock = sim.clock
+
+    __count = 0
+    for __delta, __pin, __level, __silent in records(data):
+        clock.advance_us(int(__delta / speed))
+
+        __p = pins[__pin]
+        __p.drive(__level, irq=False)
+        if not __silent and __p.handler is not None:
+            __p.handler(__p)
+        __count += 1
+
+    return __count
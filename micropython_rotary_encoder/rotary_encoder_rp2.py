@@ -1,11 +1,87 @@
-from machine import Pin, Timer
-import uasyncio as asyncio
-from .rotary_encoder import RotaryEncoder
+import sys
+
+from . import hal
+from .hal import Pin
+from .rotary_encoder import RotaryEncoder, RotaryEncoderResolution, PIN_CLK, PIN_DT
+
+# the SIO GPIO_IN register of the RP2040, bit n is the level of GPIO n, one read gives all of them at the same instant.
+# Only GPIO 0..29 exist, so the value is always a small int and reading it in a hard interrupt allocates nothing
+_SIO_GPIO_IN = 0xd0000004
+_GPIO_COUNT = 30
+# an RP2350 sets bits 30 and 31 of GPIO_IN as well, its read may be a big int which allocates, the snapshot is RP2040 only.
+# A host has no sys.implementation._machine, its simulated mem32 is the one of an RP2040
+_GPIO_SNAPSHOT = "RP2040" in getattr(sys.implementation, "_machine", "RP2040")
+
+
+def _pin_gpio(pin) -> int:
+    """_pin_gpio returns the GPIO number of a pin from its repr, Pin(GPIO15, ...) or Pin(15, ...), -1 if it has none"""
+    __repr = repr(pin)
+    __start = __repr.find("(") + 1
+    if __repr.startswith("GPIO", __start):
+        __start += 4
+
+    __end = __start
+    while __end < len(__repr) and __repr[__end].isdigit():
+        __end += 1
+
+    return int(__repr[__start:__end]) if __end > __start else -1
 
 
 class RotaryEncoderRP2(RotaryEncoder):
-    timer: Timer = None
-    alive: bool = True
+    DISPATCH_IRQ = 0
+    "timer_tick calls the listeners inside the timer interrupt"
+    DISPATCH_SCHEDULE = 1
+    "timer_tick hands the listeners over to micropython.schedule"
+    DISPATCH_MANUAL = 2
+    "timer_tick queues the events, the main loop calls dispatch()"
+
+    __slots__ = (
+        "timer",
+        "alive",
+        "irq_hard",
+        "gpio_snapshot",
+        "wakeups",
+        "timer_tick_us",
+        "timer_tick_max_us",
+        "schedule_overflow",
+        "_dispatch_mode",
+        "_dispatch_scheduled",
+        "_dispatch_ref",
+        "_enc_gpio_clk",
+        "_enc_gpio_dt",
+    )
+
+    timer: "Timer"
+
+    alive: bool
+
+    irq_hard: bool
+    "attribute RotaryEncoderRP2.irq_hard is True when the pin handlers run as hard interrupts"
+
+    gpio_snapshot: bool
+    "attribute RotaryEncoderRP2.gpio_snapshot is True when the encoder handlers read both channels from one GPIO_IN read"
+
+    wakeups: int
+    "attribute RotaryEncoderRP2.wakeups counts the ticks run by async_event_tick"
+
+    timer_tick_us: int
+    "attribute RotaryEncoderRP2.timer_tick_us is the time spent in the timer interrupt by the last tick"
+
+    timer_tick_max_us: int
+    "attribute RotaryEncoderRP2.timer_tick_max_us is the longest time spent in the timer interrupt by a tick"
+
+    schedule_overflow: int
+    "attribute RotaryEncoderRP2.schedule_overflow counts the failed micropython.schedule calls (queue full)"
+
+    _dispatch_mode: int
+
+    _dispatch_scheduled: bool
+
+    _dispatch_ref: callable
+
+    _enc_gpio_clk: int
+
+    _enc_gpio_dt: int
 
     def __init__(
             self,
@@ -18,7 +94,15 @@ class RotaryEncoderRP2(RotaryEncoder):
             step_ms: int = 200,
             fast_ms: int = 50,
             click_ms: int = 400,
-
+            resolution: int = RotaryEncoderResolution.FULL_STEP,
+            buffer_size: int = 32,
+            fast_sps: int = 66,
+            fast_exit_sps: int = None,
+            glitch_us: int = 0,
+            timebase_us: bool = False,
+            long_hold_ms: int = 0,
+            hard_irq: bool = False,
+            gpio_snapshot: bool = False,
     ):
         super().__init__(
             pin_clk=pin_clk,
@@ -30,7 +114,36 @@ class RotaryEncoderRP2(RotaryEncoder):
             step_ms=step_ms,
             fast_ms=fast_ms,
             click_ms=click_ms,
+            resolution=resolution,
+            buffer_size=buffer_size,
+            fast_sps=fast_sps,
+            fast_exit_sps=fast_exit_sps,
+            glitch_us=glitch_us,
+            timebase_us=timebase_us,
+            long_hold_ms=long_hold_ms,
+        )
+
+        self.timer = None
+        self.alive = True
+        self.irq_hard = hard_irq
+        # the GPIO numbers are the shifts of the channels in GPIO_IN,
+        # a pin whose number is unknown keeps the Pin.value() handlers
+        self._enc_gpio_clk = _pin_gpio(pin_clk) if gpio_snapshot and pin_clk is not None else -1
+        self._enc_gpio_dt = _pin_gpio(pin_dt) if gpio_snapshot and pin_dt is not None else -1
+        self.gpio_snapshot = (
+            _GPIO_SNAPSHOT
+            and hal.mem32 is not None
+            and 0 <= self._enc_gpio_clk < _GPIO_COUNT
+            and 0 <= self._enc_gpio_dt < _GPIO_COUNT
         )
+        self.wakeups = 0
+        self.timer_tick_us = 0
+        self.timer_tick_max_us = 0
+        self.schedule_overflow = 0
+        self._dispatch_mode = self.DISPATCH_IRQ
+        self._dispatch_scheduled = False
+        # bound method created once, creating it in the interrupt would allocate
+        self._dispatch_ref = self._scheduled_dispatch
 
         self._enable_irq()
 
@@ -42,25 +155,127 @@ class RotaryEncoderRP2(RotaryEncoder):
 
     async def async_tick(self, timeout=1):
         """async_tick is used to process the encoder events. It should be run by asyncio."""
+        self._direct_mode()
+        asyncio = hal.asyncio
         while self.alive:
-            self.__tick()
+            self._tick()
             await asyncio.sleep_ms(timeout)
 
-    def timer_tick(self, timeout=1):
+    async def async_event_tick(self):
+        """
+            async_event_tick is used to process the encoder events. It should be run by asyncio.
+            Unlike async_tick it sleeps until the next pin edge or the next pending timeout
+            (hold, multiple click window, end of a turn), so an idle encoder costs nothing.
+        """
+        if self._irq_flag is not None:
+            raise ValueError("RotaryEncoder: the encoder is already ticked by an event driven tick or group")
+
+        self._direct_mode()
+        asyncio = hal.asyncio
+        flag = asyncio.ThreadSafeFlag()
+        self._irq_flag = flag
+
+        try:
+            while self.alive:
+                self.wakeups += 1
+                self._tick()
+
+                timeout = self._tick_timeout()
+                if timeout < 0:
+                    await flag.wait()
+                elif timeout == 0:
+                    await asyncio.sleep_ms(0)
+                else:
+                    try:
+                        await asyncio.wait_for_ms(flag.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            self._irq_flag = None
+
+    def timer_tick(self, timeout=1, dispatch=DISPATCH_IRQ, queue_size=16):
         """
             timer_tick is used to process the encoder events. It automatically creates the system irq timer.
+            The listeners are called according to dispatch: DISPATCH_IRQ - inside the interrupt, as in the previous versions,
+            DISPATCH_SCHEDULE - by micropython.schedule, DISPATCH_MANUAL - by dispatch() from the main loop,
+            with these two only the state machines run in the interrupt.
+            queue_size is the size of the queue of the events waiting for the listeners, it holds queue_size - 1 events.
             :link https://docs.micropython.org/en/latest/rp2/quickref.html#timers
         """
-        self.timer = Timer(-1, period=timeout, mode=Timer.PERIODIC, callback=lambda t: self.__tick())
+        if dispatch == self.DISPATCH_IRQ:
+            self._direct_mode()
+        else:
+            self._dispatch_mode = dispatch
+            self._defer_dispatch(queue_size)
+
+        self.timer = hal.Timer(-1, period=timeout, mode=hal.Timer.PERIODIC, callback=self._timer_callback)
+
+    def dispatch(self):
+        """dispatch calls the listeners of the events queued by timer_tick with DISPATCH_MANUAL"""
+        self._dispatch()
+
+    def _timer_callback(self, timer):
+        start = hal.ticks_us()
+
+        self._tick()
+
+        if (
+                self._dispatch_mode == self.DISPATCH_SCHEDULE
+                and not self._dispatch_scheduled
+                and self._evq_head != self._evq_tail
+        ):
+            # a single pending schedule per encoder, when the queue is full the next tick retries
+            try:
+                hal.schedule(self._dispatch_ref, 0)
+                self._dispatch_scheduled = True
+            except RuntimeError:
+                self.schedule_overflow += 1
+
+        spent = hal.ticks_diff(hal.ticks_us(), start)
+        self.timer_tick_us = spent
+        if spent > self.timer_tick_max_us:
+            self.timer_tick_max_us = spent
+
+    def _scheduled_dispatch(self, _):
+        self._dispatch_scheduled = False
+        self._dispatch()
 
     def raw_tick(self):
         """raw_tick is used to process the encoder events. It should be run by the main loop manually. """
-        self.__tick()
+        if self._dispatch_mode != self.DISPATCH_IRQ:
+            self._direct_mode()
+        self._tick()
+
+    def _direct_mode(self):
+        """_direct_mode makes the tick call the listeners again, after a timer_tick which queued the events"""
+        self._dispatch_mode = self.DISPATCH_IRQ
+        self._direct_dispatch()
+
+    def _enc_clk_irq_handler(self, pin):
+        __in = hal.mem32[_SIO_GPIO_IN]
+        self._enc_irq_edge(PIN_CLK, (((__in >> self._enc_gpio_dt) & 1) << 1) | ((__in >> self._enc_gpio_clk) & 1))
+
+    def _enc_dt_irq_handler(self, pin):
+        __in = hal.mem32[_SIO_GPIO_IN]
+        self._enc_irq_edge(PIN_DT, (((__in >> self._enc_gpio_dt) & 1) << 1) | ((__in >> self._enc_gpio_clk) & 1))
 
     def _enable_irq(self):
+        # a hard handler runs right on the edge, so the pins are read before they change again,
+        # the handlers only decode and push records, they allocate nothing (see benchmarks/bench_alloc.py)
+        __hard = self.irq_hard
+        if __hard:
+            # an exception in a hard handler cannot allocate its own traceback
+            hal.alloc_emergency_exception_buf(100)
+        __trigger = hal.Pin.IRQ_FALLING | hal.Pin.IRQ_RISING
+
         if self.pin_clk is not None and self.pin_dt is not None:
-            self.pin_clk.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, handler=self._enc_irq_handler)
-            self.pin_dt.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, handler=self._enc_irq_handler)
+            # with gpio_snapshot every channel has its own handler, both read the two levels at once from GPIO_IN
+            if self.gpio_snapshot:
+                self.pin_clk.irq(trigger=__trigger, handler=self._enc_clk_irq_handler, hard=__hard)
+                self.pin_dt.irq(trigger=__trigger, handler=self._enc_dt_irq_handler, hard=__hard)
+            else:
+                self.pin_clk.irq(trigger=__trigger, handler=self._enc_irq_handler, hard=__hard)
+                self.pin_dt.irq(trigger=__trigger, handler=self._enc_irq_handler, hard=__hard)
 
         if self.pin_sw is not None:
-            self.pin_sw.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, handler=self._sw_irq_handler)
+            self.pin_sw.irq(trigger=__trigger, handler=self._sw_irq_handler, hard=__hard)
@@ -0,0 +1,105 @@
+from array import array
+
+# tick_total_us is halved together with ticks once it reaches this, a MicroPython small int holds 30 bits,
+# a bigger total would allocate on every tick after hours of tick time
+_TOTAL_MAX = 1 << 29
+
+
+class RotaryEncoderStats:
+    """
+        RotaryEncoderStats holds the runtime counters of an encoder, collected after encoder.enable_stats().
+        The durations are in microseconds.
+    """
+
+    __slots__ = (
+        "irq_clk",
+        "irq_dt",
+        "irq_sw",
+        "enc_ignored",
+        "enc_invalid",
+        "enc_glitches",
+        "sw_debounced",
+        "events",
+        "listener_errors",
+        "ticks",
+        "tick_total_us",
+        "tick_max_us",
+        "dispatch_max_us",
+    )
+
+    irq_clk: int
+    "attribute RotaryEncoderStats.irq_clk counts the interrupts of the clk pin"
+
+    irq_dt: int
+    "attribute RotaryEncoderStats.irq_dt counts the interrupts of the dt pin"
+
+    irq_sw: int
+    "attribute RotaryEncoderStats.irq_sw counts the interrupts of the button pin"
+
+    enc_ignored: int
+    "attribute RotaryEncoderStats.enc_ignored counts the encoder interrupts which found the pins unchanged"
+
+    enc_invalid: int
+    "attribute RotaryEncoderStats.enc_invalid counts the invalid transitions (both pins changed, an edge was missed)"
+
+    enc_glitches: int
+    "attribute RotaryEncoderStats.enc_glitches counts the encoder edges rejected by the glitch filter"
+
+    sw_debounced: int
+    "attribute RotaryEncoderStats.sw_debounced counts the button edges rejected by the debounce"
+
+    events: array
+    "attribute RotaryEncoderStats.events counts the emitted events, indexed by the event id"
+
+    listener_errors: int
+    "attribute RotaryEncoderStats.listener_errors counts the exceptions raised by the listeners"
+
+    ticks: int
+    "attribute RotaryEncoderStats.ticks counts the ticks which had an edge or a due timeout, the idle ticks return before, halved with tick_total_us"
+
+    tick_total_us: int
+    "attribute RotaryEncoderStats.tick_total_us is the time spent in the ticks, it and ticks are halved when it reaches 2^29, the average stays"
+
+    tick_max_us: int
+    "attribute RotaryEncoderStats.tick_max_us is the longest tick"
+
+    dispatch_max_us: int
+    "attribute RotaryEncoderStats.dispatch_max_us is the longest call of the listeners of one event"
+
+    def __init__(self, events: int):
+        self.events = array("I", [0] * events)
+        self.reset()
+
+    def reset(self):
+        """reset sets all the counters to zero"""
+        self.irq_clk = 0
+        self.irq_dt = 0
+        self.irq_sw = 0
+        self.enc_ignored = 0
+        self.enc_invalid = 0
+        self.enc_glitches = 0
+        self.sw_debounced = 0
+        for i in range(len(self.events)):
+            self.events[i] = 0
+        self.listener_errors = 0
+        self.ticks = 0
+        self.tick_total_us = 0
+        self.tick_max_us = 0
+        self.dispatch_max_us = 0
+
+    def tick_avg_us(self) -> int:
+        """tick_avg_us returns the average tick duration"""
+        return self.tick_total_us // self.ticks if self.ticks else 0
+
+    def _tick_done(self, us: int):
+        self.ticks += 1
+        self.tick_total_us += us
+        if self.tick_total_us >= _TOTAL_MAX:
+            self.ticks >>= 1
+            self.tick_total_us >>= 1
+        if us > self.tick_max_us:
+            self.tick_max_us = us
+
+    def _dispatch_done(self, us: int):
+        if us > self.dispatch_max_us:
+            self.dispatch_max_us = us
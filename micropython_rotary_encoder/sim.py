@@ -0,0 +1,271 @@
+"""
+Simulated backend for running the library on a host (CPython).
+
+- ``VirtualClock`` is a deterministic clock, time moves only when it is advanced.
+- ``SimPin`` is a scriptable ``machine.Pin``, ``drive()`` changes the level and fires the irq handler.
+- ``SimTimer`` is a ``machine.Timer`` fired by the virtual clock.
+- ``mem32`` is ``machine.mem32`` of an RP2040 with only the GPIO_IN register, the levels of the ``SimPin`` objects.
+- ``schedule`` is ``micropython.schedule``, the callbacks run after the timer callback that scheduled them.
+
+``hal`` falls back to this module when ``machine``/``utime`` are missing, so usually you only need:
+
+    from micropython_rotary_encoder import sim
+    pin_clk = sim.SimPin(15, sim.SimPin.IN, sim.SimPin.PULL_UP)
+    ...
+    pin_clk.drive(0)
+    sim.clock.advance_ms(5)
+"""
+
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALF = TICKS_PERIOD // 2
+
+
+class VirtualClock:
+    """Deterministic replacement for utime, with MicroPython ticks wraparound semantics"""
+
+    def __init__(self, start_us: int = 0):
+        self._now_us = start_us
+        self._timers = []
+
+    def reset(self, start_us: int = 0):
+        """reset moves the clock back to start_us and drops all timers"""
+        self._now_us = start_us
+        self._timers = []
+
+    def now_us(self) -> int:
+        """now_us returns the absolute (not wrapped) time in microseconds"""
+        return self._now_us
+
+    def ticks_us(self) -> int:
+        return self._now_us & TICKS_MAX
+
+    def ticks_ms(self) -> int:
+        return (self._now_us // 1000) & TICKS_MAX
+
+    @staticmethod
+    def ticks_diff(ticks1: int, ticks2: int) -> int:
+        diff = (ticks1 - ticks2) & TICKS_MAX
+        if diff >= TICKS_HALF:
+            diff -= TICKS_PERIOD
+        return diff
+
+    @staticmethod
+    def ticks_add(ticks: int, delta: int) -> int:
+        return (ticks + delta) & TICKS_MAX
+
+    def advance_us(self, us: int):
+        """advance_us moves the time forward and fires the timers that became due on the way"""
+        target = self._now_us + us
+
+        while True:
+            timer = None
+            for t in self._timers:
+                if t.due_us <= target and (timer is None or t.due_us < timer.due_us):
+                    timer = t
+
+            if timer is None:
+                break
+
+            self._now_us = timer.due_us
+            if timer.mode == SimTimer.PERIODIC:
+                timer.due_us += timer.period_us
+            else:
+                self._timers.remove(timer)
+            timer.callback(timer)
+            run_scheduled()
+
+        self._now_us = target
+
+    def advance_ms(self, ms: int):
+        self.advance_us(ms * 1000)
+
+
+clock = VirtualClock()
+"default clock, used by hal when the library runs on a host"
+
+
+def disable_irq() -> int:
+    """disable_irq is machine.disable_irq, the simulated interrupts never preempt the code"""
+    return 0
+
+
+def enable_irq(state: int = 0):
+    """enable_irq is machine.enable_irq"""
+
+
+SCHEDULE_DEPTH = 8
+_scheduled = []
+
+
+def schedule(func, arg):
+    """schedule is micropython.schedule, it raises RuntimeError when the queue is full"""
+    if len(_scheduled) >= SCHEDULE_DEPTH:
+        raise RuntimeError("schedule queue full")
+    _scheduled.append((func, arg))
+
+
+def run_scheduled():
+    """run_scheduled runs the scheduled callbacks, as MicroPython does once the interrupt returns"""
+    while _scheduled:
+        func, arg = _scheduled.pop(0)
+        func(arg)
+
+
+class SimPin:
+    """Scriptable replacement for machine.Pin"""
+
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id=None, mode: int = -1, pull: int = -1, value: int = None):
+        self.id = id
+        self.handler = None
+        self.trigger = 0
+        self.hard = False
+
+        if value is None:
+            value = 1 if pull == self.PULL_UP else 0
+        self._value = 1 if value else 0
+
+        # the pin is the GPIO of its id, the last pin created with an id wins
+        if isinstance(id, int):
+            mem32.gpio[id] = self
+
+    def __repr__(self):
+        return "SimPin(%s, value=%d)" % (self.id, self._value)
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+
+        self.drive(value)
+
+    def irq(self, handler=None, trigger: int = IRQ_FALLING | IRQ_RISING, hard: bool = False):
+        self.handler = handler
+        self.trigger = trigger
+        self.hard = hard
+
+    def drive(self, level: int, irq: bool = True):
+        """
+            drive sets the pin level, on an edge the irq handler is called like the hardware would do.
+            With irq=False the edge is missed, as with an interrupt served too late.
+        """
+        level = 1 if level else 0
+        if level == self._value:
+            return
+
+        self._value = level
+        if irq and self.handler is not None and self.trigger & (self.IRQ_RISING if level else self.IRQ_FALLING):
+            self.handler(self)
+
+
+GPIO_IN = 0xd0000004
+"address of the SIO GPIO_IN register of the RP2040, bit n is the level of GPIO n"
+
+
+class SimMem32:
+    """Replacement for machine.mem32, only GPIO_IN can be read"""
+
+    def __init__(self):
+        self.gpio = {}
+
+    def __getitem__(self, address: int) -> int:
+        if address != GPIO_IN:
+            raise ValueError("SimMem32: only GPIO_IN is simulated")
+
+        levels = 0
+        for gpio, pin in self.gpio.items():
+            levels |= pin._value << gpio
+        return levels
+
+
+mem32 = SimMem32()
+"default memory, used by hal when the library runs on a host"
+
+
+class SimTimer:
+    """Replacement for machine.Timer, fired by VirtualClock.advance_us"""
+
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id: int = -1, mode: int = PERIODIC, period: int = -1, callback=None, freq: int = -1):
+        self.clock = clock
+        self.mode = mode
+        self.period_us = 0
+        self.due_us = 0
+        self.callback = None
+
+        if callback is not None:
+            self.init(mode=mode, period=period, callback=callback, freq=freq)
+
+    def init(self, mode: int = PERIODIC, period: int = -1, callback=None, freq: int = -1):
+        self.deinit()
+
+        if freq > 0:
+            self.period_us = 1000000 // freq
+        else:
+            self.period_us = max(period, 1) * 1000
+
+        self.mode = mode
+        self.callback = callback
+        self.due_us = self.clock.now_us() + self.period_us
+        self.clock._timers.append(self)
+
+    def deinit(self):
+        if self in self.clock._timers:
+            self.clock._timers.remove(self)
+
+
+class _ThreadSafeFlag:
+    """uasyncio.ThreadSafeFlag on top of asyncio.Event, set() must be called from the event loop thread"""
+
+    def __init__(self):
+        import asyncio
+
+        self._event = asyncio.Event()
+
+    def set(self):
+        self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self):
+        await self._event.wait()
+        self._event.clear()
+
+
+class _Asyncio:
+    """uasyncio flavoured view of the CPython asyncio module"""
+
+    ThreadSafeFlag = _ThreadSafeFlag
+
+    def __getattr__(self, name):
+        import asyncio
+
+        return getattr(asyncio, name)
+
+    @staticmethod
+    def sleep_ms(ms: int):
+        import asyncio
+
+        return asyncio.sleep(ms / 1000)
+
+    @staticmethod
+    def wait_for_ms(awaitable, timeout: int):
+        import asyncio
+
+        return asyncio.wait_for(awaitable, timeout / 1000)
+
+
+asyncio = _Asyncio()